@@ -2,6 +2,17 @@ import os
 import re
 import json
 import glob
+import time
+import hashlib
+import concurrent.futures
+from array import array
+from json.decoder import scanstring
+
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
 
 # 文件配置
 FILE_CONFIG = {
@@ -16,10 +27,18 @@ FILE_CONFIG = {
         "requirements.txt",
         "temp.txt",
         "*.tmp",
-        "drafts/*"
+        "drafts/*",
+        "*_cleaned.txt"  # 本脚本的输出文件
     ]
 }
 
+# 运行配置：并行进程数（None 为 CPU 核数）、增量清洗清单文件、是否忽略清单全部重新清洗
+RUN_CONFIG = {
+    "workers": None,
+    "manifest": ".clean_manifest.json",
+    "force": False,
+}
+
 # 清洗策略列表
 CLEANING_STRATEGIES = [
     {
@@ -35,11 +54,573 @@ CLEANING_STRATEGIES = [
     # 在这里添加更多清洗策略
 ]
 
+# 流式处理配置：每次读取的字符数，以及单个匹配可能的最大长度（块边界处保留的重叠窗口）
+STREAM_CONFIG = {
+    "chunk_size": 1 << 20,
+    "max_match_length": 4096,
+}
+
+# JSON/JSONL 清洗的字段路径，用点分隔，* 匹配任意键或数组元素，例如 "pages.*.content"；为空时清洗所有字符串
+JSON_CONFIG = {
+    "fields": [],
+    "indent": 2,
+}
+
+# 全语料模板段落去除：出现在超过 page_ratio 比例（且至少 min_pages 个）页面中的行只保留第一次出现。
+# 页面按爬虫输出的 '---' 分隔符切分，JSONL 每行一页；频次用 Count-Min Sketch 统计，内存固定
+BOILERPLATE_CONFIG = {
+    "enabled": False,
+    "page_ratio": 0.2,
+    "min_pages": 3,
+    "min_length": 20,
+    "sketch_width": 1 << 20,
+    "sketch_depth": 4,
+}
+
+_GLOBAL_FLAGS_RE = re.compile(r'^\(\?([aiLmsux]+)\)')
+_SCOPED_FLAGS = ((re.IGNORECASE, 'i'), (re.MULTILINE, 'm'), (re.DOTALL, 's'), (re.VERBOSE, 'x'))
+
+
+class CleaningRule:
+    def __init__(self, name, pattern, replacement):
+        self.name = name
+        self.regex = re.compile(pattern)
+        self.replacement = replacement
+        # 替换串不含反斜杠时不需要 expand，直接用字面值
+        self.literal = '\\' not in replacement
+        self.hits = 0
+        self.time = 0.0
+
+    def has_group_reference(self):
+        """True if the pattern refers back to its own groups (\\1, (?P=name), (?(1)...)).
+
+        Wrapped in the combined regex the rule's groups are renumbered, so such references would
+        silently point at another rule's groups.
+        """
+        pending = [sre_parse.parse(self.regex.pattern, self.regex.flags)]
+        while pending:
+            item = pending.pop()
+            if isinstance(item, sre_parse.SubPattern):
+                for op, av in item:
+                    if op in (sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS):
+                        return True
+                    pending.append(av)
+            elif isinstance(item, (tuple, list)):
+                pending.extend(item)
+        return False
+
+    def scoped_pattern(self):
+        """Return the pattern with leading global flags turned into a scoped group."""
+        pattern = _GLOBAL_FLAGS_RE.sub('', self.regex.pattern)
+        flags = ''.join(letter for flag, letter in _SCOPED_FLAGS if self.regex.flags & flag)
+        return f"(?{flags}:{pattern})" if flags else pattern
+
+
+class CleaningEngine:
+    """Apply all cleaning rules in a single scan using one combined alternation regex.
+
+    At each position the first listed rule that matches wins; replaced text is not rescanned.
+    """
+
+    def __init__(self, strategies):
+        self.rules = [CleaningRule(s["name"], s["pattern"], s["replacement"]) for s in strategies]
+        self.scan_time = 0.0
+        referencing = [rule.name for rule in self.rules if rule.has_group_reference()]
+        if referencing:
+            print(f"清洗规则含分组反向引用，无法合并为单次扫描，改为逐条执行: {', '.join(referencing)}")
+            self.combined = None
+            return
+        try:
+            self.combined = re.compile('|'.join(f"(?P<_rule{i}>{rule.scoped_pattern()})"
+                                                for i, rule in enumerate(self.rules)))
+        except re.error as e:
+            # 规则之间组名冲突等无法合并的情况，退回逐条替换
+            print(f"清洗规则无法合并为单次扫描，改为逐条执行: {str(e)}")
+            self.combined = None
+
+    def _replace(self, match):
+        start = time.perf_counter()
+        rule = self.rules[int(match.lastgroup[len('_rule'):])]
+        rule.hits += 1
+        if rule.literal:
+            result = rule.replacement
+        else:
+            # 用规则自身的正则在同一位置重新匹配，使 \1 等分组引用按规则内的编号展开
+            result = rule.regex.match(match.string, match.start()).expand(rule.replacement)
+        rule.time += time.perf_counter() - start
+        return result
+
+    def clean(self, text):
+        start = time.perf_counter()
+        if self.combined is None:
+            for rule in self.rules:
+                text, count = rule.regex.subn(rule.replacement, text)
+                rule.hits += count
+        else:
+            text = self.combined.sub(self._replace, text)
+        self.scan_time += time.perf_counter() - start
+        return text
+
+    def clean_stream(self, source, write, chunk_size=None, max_match_length=None):
+        """Clean a text stream chunk by chunk; matches up to max_match_length may span chunk boundaries."""
+        chunk_size = chunk_size or STREAM_CONFIG["chunk_size"]
+        overlap = max_match_length or STREAM_CONFIG["max_match_length"]
+        if self.combined is None:
+            # 逐条执行时无法保证跨块匹配的正确性，只能整体处理
+            write(self.clean(source.read()))
+            return
+        buffer = ''
+        while True:
+            chunk = source.read(chunk_size)
+            at_end = not chunk
+            buffer += chunk
+            # 重叠窗口之前开始的匹配一定已完整出现在缓冲区内，可以安全输出
+            commit_end = len(buffer) if at_end else max(0, len(buffer) - overlap)
+            start = time.perf_counter()
+            pieces = []
+            last = 0
+            for match in self.combined.finditer(buffer):
+                if match.start() >= commit_end:
+                    break
+                pieces.append(buffer[last:match.start()])
+                pieces.append(self._replace(match))
+                last = match.end()
+            if last < commit_end:
+                pieces.append(buffer[last:commit_end])
+                last = commit_end
+            self.scan_time += time.perf_counter() - start
+            write(''.join(pieces))
+            buffer = buffer[last:]
+            if at_end:
+                return
+
+    def report(self):
+        return [(rule.name, rule.hits, rule.time) for rule in self.rules]
+
+    def reset_stats(self):
+        self.scan_time = 0.0
+        for rule in self.rules:
+            rule.hits = 0
+            rule.time = 0.0
+
+
+_engine = None
+
+
+def get_engine():
+    global _engine
+    if _engine is None:
+        _engine = CleaningEngine(CLEANING_STRATEGIES)
+    return _engine
+
 
 def clean_content(content):
-    for strategy in CLEANING_STRATEGIES:
-        content = re.sub(strategy["pattern"], strategy["replacement"], content)
-    return content.strip()
+    return get_engine().clean(content).strip()
+
+
+class StrippedWriter:
+    """Write streamed text to a file with leading and trailing whitespace of the whole output removed."""
+
+    def __init__(self, file):
+        self.file = file
+        self.started = False
+        self.pending = ''
+        self.count = 0
+
+    def write(self, text):
+        if not self.started:
+            text = text.lstrip()
+            if not text:
+                return
+            self.started = True
+        body = text.rstrip()
+        if body:
+            self.file.write(self.pending + body)
+            self.count += len(self.pending) + len(body)
+            self.pending = text[len(body):]
+        else:
+            self.pending += text
+
+
+class FieldMatcher:
+    """Match JSON value paths against dotted field patterns; no patterns means every string matches."""
+
+    def __init__(self, fields):
+        self.patterns = [tuple(field.split('.')) for field in fields]
+
+    def matches(self, path):
+        if not self.patterns:
+            return True
+        return any(len(pattern) == len(path) and all(p == '*' or p == key for p, key in zip(pattern, path))
+                   for pattern in self.patterns)
+
+
+_JSON_WS_RE = re.compile(r'[ \t\n\r]*')
+_JSON_SCALAR_RE = re.compile(r'-?(?:0|[1-9]\d*)(?:\.\d+)?(?:[eE][-+]?\d+)?|true|false|null')
+
+
+def iter_json_tokens(source, chunk_size=1 << 16):
+    """Tokenize a JSON text stream incrementally; yields (token, value) with token in '{}[],:', 'string', 'scalar'.
+
+    Only the current chunk and the string being read are held in memory.
+    """
+    buffer = ''
+    pos = 0
+    eof = False
+    while True:
+        pos = _JSON_WS_RE.match(buffer, pos).end()
+        if pos >= len(buffer) or (not eof and buffer[pos] not in '{}[],:' and len(buffer) - pos < 64):
+            # 缓冲区用完或剩余太短（数字可能被截断），再读一块
+            if eof:
+                if pos >= len(buffer):
+                    return
+            else:
+                chunk = source.read(chunk_size)
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+        char = buffer[pos]
+        if char in '{}[],:':
+            pos += 1
+            yield char, None
+        elif char == '"':
+            try:
+                value, end = scanstring(buffer, pos + 1)
+            except ValueError:
+                if eof:
+                    raise
+                # 字符串跨块，读入更多内容后重试
+                chunk = source.read(max(chunk_size, len(buffer)))
+                eof = not chunk
+                buffer = buffer[pos:] + chunk
+                pos = 0
+                continue
+            pos = end
+            yield 'string', value
+        else:
+            match = _JSON_SCALAR_RE.match(buffer, pos)
+            if not match:
+                raise ValueError(f"Invalid JSON at: {buffer[pos:pos + 20]!r}")
+            pos = match.end()
+            yield 'scalar', match.group()
+
+
+def clean_json_stream(source, write, matcher, indent=2):
+    """Clean string values at matching paths while re-serializing the document token by token.
+
+    Output is formatted like json.dump(indent=indent); a top-level string is written as plain text.
+    Returns the total length of the cleaned strings.
+    """
+    newline = '\n' if indent else ''
+    pad = ' ' * (indent or 0)
+    stack = []  # 每层: [类型 '{' 或 '[', 已写元素数, 下一个字符串是否为键]
+    path = []
+    count = 0
+    for token, value in iter_json_tokens(source):
+        frame = stack[-1] if stack else None
+        if token == ',':
+            if frame and frame[0] == '{':
+                frame[2] = True
+            continue
+        if token == ':':
+            continue
+        if token in '}]':
+            stack.pop()
+            if frame[1]:
+                write(newline + pad * len(stack))
+            write(token)
+            if stack:
+                path.pop()
+            continue
+        if frame and frame[0] == '{' and frame[2]:
+            if token != 'string':
+                raise ValueError(f"Expected an object key, got {token}")
+            write((',' if frame[1] else '') + newline + pad * len(stack))
+            write(json.dumps(value, ensure_ascii=False) + ': ')
+            frame[1] += 1
+            frame[2] = False
+            path.append(value)
+            continue
+        if frame and frame[0] == '[':
+            write((',' if frame[1] else '') + newline + pad * len(stack))
+            frame[1] += 1
+            path.append('*')
+        if token in '{[':
+            write(token)
+            stack.append([token, 0, token == '{'])
+            continue
+        if token == 'string':
+            if matcher.matches(path):
+                value = clean_content(value)
+                count += len(value)
+            write(json.dumps(value, ensure_ascii=False) if stack else value)
+        else:
+            write(value)
+        if stack:
+            path.pop()
+    return count
+
+
+def clean_json_value(value, matcher, path=()):
+    """Clean matching strings in an in-memory JSON value; returns (value, cleaned length)."""
+    if isinstance(value, str):
+        if matcher.matches(path):
+            value = clean_content(value)
+            return value, len(value)
+        return value, 0
+    count = 0
+    if isinstance(value, dict):
+        for key in value:
+            value[key], n = clean_json_value(value[key], matcher, path + (key,))
+            count += n
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            value[index], n = clean_json_value(item, matcher, path + ('*',))
+            count += n
+    return value, count
+
+
+def clean_jsonl_stream(source, write, matcher, boilerplate_filter=None):
+    """Clean a JSONL stream one record at a time; invalid lines are kept unchanged."""
+    count = 0
+    for line_number, line in enumerate(source, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            print(f"第{line_number}行不是合法的 JSON，原样保留: {str(e)}")
+            write(line if line.endswith('\n') else line + '\n')
+            continue
+        if boilerplate_filter:
+            record = boilerplate_filter.filter_record(record, line_number, matcher)
+        record, n = clean_json_value(record, matcher)
+        count += n
+        write(json.dumps(record, ensure_ascii=False) + '\n')
+    return count
+
+
+class CountMinSketch:
+    """Approximate counter with fixed memory; estimates never undercount."""
+
+    def __init__(self, width, depth):
+        self.width = width
+        self.depth = depth
+        self.table = array('I', bytes(4 * width * depth))
+
+    def _cells(self, key):
+        # 由 64 位哈希派生各行下标（双重哈希）
+        h1 = key & 0xffffffff
+        h2 = (key >> 32) | 1
+        return [row * self.width + (h1 + row * h2) % self.width for row in range(self.depth)]
+
+    def add(self, key):
+        """Increment with conservative update and return the new estimate."""
+        cells = self._cells(key)
+        estimate = min(self.table[cell] for cell in cells) + 1
+        for cell in cells:
+            if self.table[cell] < estimate:
+                self.table[cell] = estimate
+        return estimate
+
+    def estimate(self, key):
+        return min(self.table[cell] for cell in self._cells(key))
+
+
+PAGE_SEPARATOR = '---'
+
+
+def is_page_start(previous, line):
+    # 爬虫输出用 '---\n'.join 拼接页面，分隔符接在上一页最后一行的末尾，下一行是 "## 标题"
+    return previous.rstrip('\n').endswith(PAGE_SEPARATOR) and line.startswith('## ')
+
+
+class PageTracker:
+    """Follow page boundaries through crawler output one line at a time."""
+
+    def __init__(self):
+        self.page = 0
+        self.previous = ''
+        self.title_pending = True
+
+    def feed(self, line):
+        """Advance over one line; returns (line starts a new page, line is the page's '## ' title)."""
+        new_page = is_page_start(self.previous, line)
+        if new_page:
+            self.page += 1
+            self.title_pending = True
+        self.previous = line
+        is_title = self.title_pending and line.startswith('## ')
+        if is_title or not line.startswith('# '):
+            # 页面开头只会是文件头 "# ..." 和页面标题 "## ..."
+            self.title_pending = False
+        return new_page, is_title
+
+
+def block_hash(line, min_length):
+    """Hash a line with whitespace collapsed; None for lines too short to count as boilerplate."""
+    text = ' '.join(line.split())
+    if text.endswith(PAGE_SEPARATOR):
+        # 页尾行带着分隔符，去掉后才能与其他页面中的同一行匹配
+        text = text[:-len(PAGE_SEPARATOR)].rstrip()
+    if len(text) < min_length:
+        return None
+    return int.from_bytes(hashlib.blake2b(text.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+def iter_matched_strings(value, matcher, path=()):
+    if isinstance(value, str):
+        if matcher.matches(path):
+            yield value
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            yield from iter_matched_strings(item, matcher, path + (key,))
+    elif isinstance(value, list):
+        for item in value:
+            yield from iter_matched_strings(item, matcher, path + ('*',))
+
+
+def iter_pages(file_path, matcher):
+    """Yield (page number, lines) one page at a time; JSON documents are not split into pages."""
+    with open(file_path, 'r', encoding='utf-8') as file:
+        if file_path.endswith('.jsonl'):
+            for line_number, line in enumerate(file, 1):
+                try:
+                    record = json.loads(line) if line.strip() else None
+                except ValueError:
+                    continue
+                if record is not None:
+                    yield line_number, [text_line for text in iter_matched_strings(record, matcher)
+                                        for text_line in text.splitlines()]
+        elif not file_path.endswith('.json'):
+            tracker = PageTracker()
+            lines = []
+            for line in file:
+                new_page, is_title = tracker.feed(line)
+                if new_page:
+                    yield tracker.page - 1, lines
+                    lines = []
+                if is_title:
+                    # 页面标题是分页依据，即使每页相同（例如站点名）也不能当作模板段落
+                    continue
+                lines.append(line)
+            yield tracker.page, lines
+
+
+def build_boilerplate_index(files, matcher):
+    """Find lines repeated across many pages and the page where each first appears.
+
+    Returns (boilerplate hashes, {file: {page: hashes kept there}}, {file: fingerprint}).
+    """
+    config = BOILERPLATE_CONFIG
+    sketch = CountMinSketch(config["sketch_width"], config["sketch_depth"])
+    candidates = set()
+    total_pages = 0
+    # 第一遍：统计每行出现的页面数（同一页内只计一次），达到 min_pages 的才作为候选保留
+    for file_path in files:
+        for _, lines in iter_pages(file_path, matcher):
+            total_pages += 1
+            hashes = {block_hash(line, config["min_length"]) for line in lines}
+            hashes.discard(None)
+            for key in hashes:
+                if sketch.add(key) >= config["min_pages"]:
+                    candidates.add(key)
+    threshold = max(config["min_pages"], config["page_ratio"] * total_pages)
+    # 与配置说明一致：页面数超过 page_ratio 比例，且至少 min_pages 个
+    boilerplate = frozenset(key for key in candidates
+                            if sketch.estimate(key) >= config["min_pages"]
+                            and sketch.estimate(key) > config["page_ratio"] * total_pages)
+
+    # 第二遍：确定每个模板行第一次出现的页面，只在那里保留
+    owners = {}
+    fingerprints = {}
+    seen = set()
+    for file_path in files:
+        owned = {}
+        present = set()
+        for page, lines in iter_pages(file_path, matcher):
+            for line in lines:
+                key = block_hash(line, config["min_length"])
+                if key in boilerplate:
+                    present.add(key)
+                    if key not in seen:
+                        seen.add(key)
+                        owned.setdefault(page, set()).add(key)
+        owners[file_path] = owned
+        # 输出只取决于文件中出现的模板行以及哪些行在本文件保留
+        state = [sorted(present), sorted((page, sorted(keys)) for page, keys in owned.items())]
+        fingerprints[file_path] = hashlib.sha256(json.dumps(state).encode('utf-8')).hexdigest()[:16]
+    print(f"模板段落统计: 共{total_pages}页, 阈值{threshold:.1f}页, 模板段落{len(boilerplate)}个")
+    return boilerplate, owners, fingerprints
+
+
+class BoilerplateFilter:
+    """Drop boilerplate lines from a page unless this page is where the line first appeared."""
+
+    def __init__(self, boilerplate, owned):
+        self.boilerplate = boilerplate
+        self.owned = owned
+        self.removed = 0
+        self.removed_chars = 0
+
+    def keep(self, page, line):
+        key = block_hash(line, BOILERPLATE_CONFIG["min_length"])
+        if key not in self.boilerplate:
+            return True
+        keys = self.owned.get(page)
+        if keys and key in keys:
+            # 同一页内重复出现的模板行也只保留一次
+            keys.discard(key)
+            return True
+        self.removed += 1
+        self.removed_chars += len(line)
+        return False
+
+    def filter_text(self, page, text):
+        return '\n'.join(line for line in text.split('\n') if self.keep(page, line))
+
+    def filter_record(self, value, page, matcher, path=()):
+        if isinstance(value, str):
+            return self.filter_text(page, value) if matcher.matches(path) else value
+        if isinstance(value, dict):
+            return {key: self.filter_record(item, page, matcher, path + (key,)) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self.filter_record(item, page, matcher, path + ('*',)) for item in value]
+        return value
+
+
+class FilteredSource:
+    """File-like reader over a text file that drops boilerplate lines, for CleaningEngine.clean_stream."""
+
+    def __init__(self, file, boilerplate_filter):
+        self.lines = iter(file)
+        self.filter = boilerplate_filter
+        self.tracker = PageTracker()
+        self.pending = ''
+
+    def read(self, size=-1):
+        parts = [self.pending]
+        length = len(self.pending)
+        while size < 0 or length < size:
+            line = next(self.lines, None)
+            if line is None:
+                break
+            _, is_title = self.tracker.feed(line)
+            if not is_title and not self.filter.keep(self.tracker.page, line):
+                if line.rstrip('\n').endswith(PAGE_SEPARATOR):
+                    # 去掉页尾的模板行时保留页面分隔符
+                    line = PAGE_SEPARATOR + '\n'
+                else:
+                    continue
+            parts.append(line)
+            length += len(line)
+        data = ''.join(parts)
+        if size < 0:
+            self.pending = ''
+            return data
+        self.pending = data[size:]
+        return data[:size]
 
 
 def should_process_file(file_path):
@@ -66,65 +647,215 @@ def should_process_file(file_path):
     return False
 
 
-def process_file(file_path):
+def rules_fingerprint():
+    """Per-rule hashes, in rule order; compared against the manifest to decide which outputs are stale."""
+    return [hashlib.sha256(json.dumps(strategy, sort_keys=True, ensure_ascii=False).encode('utf-8')).hexdigest()[:16]
+            for strategy in CLEANING_STRATEGIES]
+
+
+def rules_unchanged(entry, fingerprint):
+    """True if the rules are the same, or only rules that never matched this file were removed."""
+    old_rules = entry.get("rules") or []
+    if old_rules == fingerprint:
+        return True
+    hits = entry.get("hits") or []
+    if len(hits) != len(old_rules):
+        return False
+    kept = [rule for rule, count in zip(old_rules, hits) if count or rule in fingerprint]
+    return kept == fingerprint
+
+
+def json_fingerprint(file_path):
+    """Hash of JSON_CONFIG for .json/.jsonl inputs, whose output depends on it; None for text files."""
+    if not file_path.endswith(('.json', '.jsonl')):
+        return None
+    return hashlib.sha256(json.dumps(JSON_CONFIG, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+
+
+def file_digest(file_path):
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def output_path(file_path):
+    return f"{os.path.splitext(file_path)[0]}_cleaned.txt"
+
+
+def load_manifest(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(path, manifest):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, path)
+
+
+def is_unchanged(file_path, entry, fingerprint):
+    """Check a file against its manifest entry; returns (unchanged, stat, digest)."""
+    stat = os.stat(file_path)
+    if not entry or not rules_unchanged(entry, fingerprint) or not os.path.exists(entry.get("output", "")):
+        return False, stat, None
+    if entry.get("json") != json_fingerprint(file_path):
+        # 换了要清洗的 JSON 字段或缩进，输出需要重新生成
+        return False, stat, None
+    if entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+        return True, stat, entry.get("sha256")
+    # 大小或修改时间变了再比较内容哈希（例如文件被 touch 或重新复制）
+    digest = file_digest(file_path)
+    return digest == entry.get("sha256"), stat, digest
+
+
+def process_file(file_path, boilerplate=None):
+    """Clean one file; returns a result dict for the manifest and rule report, or None on failure.
+
+    boilerplate is (boilerplate hashes, {page: hashes kept on that page}) from build_boilerplate_index.
+    """
     if not os.path.exists(file_path):
         print(f"文件 {file_path} 不存在")
-        return
+        return None
 
+    engine = get_engine()
+    engine.reset_stats()
     try:
-        with open(file_path, 'r', encoding='utf-8') as file:
-            if file_path.endswith('.json'):
-                content = json.load(file)
-                if isinstance(content, str):
-                    cleaned_content = clean_content(content)
-                elif isinstance(content, dict):
-                    cleaned_content = {k: clean_content(v) if isinstance(v, str) else v for k, v in content.items()}
-                else:
-                    print(f"Unsupported JSON structure in {file_path}")
-                    return
-            else:
-                content = file.read()
-                cleaned_content = clean_content(content)
-
-        # 计算清理后的字数
-        if isinstance(cleaned_content, str):
-            word_count = len(cleaned_content)
-        elif isinstance(cleaned_content, dict):
-            word_count = sum(len(v) for v in cleaned_content.values() if isinstance(v, str))
-        else:
-            word_count = 0
-
         # 生成新的文件名
-        base_name = os.path.splitext(file_path)[0]
-        new_file_path = f"{base_name}_cleaned.txt"
+        new_file_path = output_path(file_path)
 
-        # 写入新文件
-        with open(new_file_path, 'w', encoding='utf-8') as file:
-            if isinstance(cleaned_content, str):
-                file.write(cleaned_content)
-            elif isinstance(cleaned_content, dict):
-                json.dump(cleaned_content, file, ensure_ascii=False, indent=2)
+        # 文本、JSON、JSONL 都边读边写，内存占用与文件大小无关
+        with open(file_path, 'r', encoding='utf-8') as file, open(new_file_path, 'w', encoding='utf-8') as out:
+            matcher = FieldMatcher(JSON_CONFIG["fields"])
+            boilerplate_filter = BoilerplateFilter(*boilerplate) if boilerplate else None
+            if file_path.endswith('.jsonl'):
+                word_count = clean_jsonl_stream(file, out.write, matcher, boilerplate_filter)
+            elif file_path.endswith('.json'):
+                word_count = clean_json_stream(file, out.write, matcher, JSON_CONFIG["indent"])
+            else:
+                writer = StrippedWriter(out)
+                engine.clean_stream(FilteredSource(file, boilerplate_filter) if boilerplate_filter else file,
+                                    writer.write)
+                word_count = writer.count
 
         print(f"处理完成: {file_path}")
         print(f"清理后字数: {word_count}")
+        if boilerplate_filter:
+            print(f"去除模板段落: {boilerplate_filter.removed}处, {boilerplate_filter.removed_chars}字")
         print(f"清理后文件保存为: {new_file_path}")
         print()
+        return {
+            "file": file_path,
+            "output": new_file_path,
+            "word_count": word_count,
+            "boilerplate_removed": boilerplate_filter.removed if boilerplate_filter else 0,
+            "scan_time": engine.scan_time,
+            "rules": engine.report(),
+        }
     except Exception as e:
         print(f"处理文件 {file_path} 时出错: {str(e)}")
+        return None
 
 
-def main():
+def print_rule_report(results):
+    print(f"清洗扫描总耗时: {sum(result['scan_time'] for result in results):.3f}秒")
+    totals = {}
+    for result in results:
+        for name, hits, seconds in result["rules"]:
+            total = totals.setdefault(name, [0, 0.0])
+            total[0] += hits
+            total[1] += seconds
+    for name, (hits, seconds) in totals.items():
+        print(f"规则 {name}: 命中{hits}次, 替换耗时{seconds * 1000:.1f}毫秒")
+
+
+def collect_files():
+    files = []
     for include_item in FILE_CONFIG["include"]:
         if '*' in include_item:
             # 如果是通配符模式，使用 glob 获取匹配的文件
-            for file_path in glob.glob(include_item):
-                if should_process_file(file_path):
-                    process_file(file_path)
+            # 排序保证文件顺序稳定，模板段落“第一次出现”的位置才可复现
+            files.extend(sorted(glob.glob(include_item)))
         else:
             # 如果是具体文件名，直接处理
-            if should_process_file(include_item):
-                process_file(include_item)
+            files.append(include_item)
+    # 多个模式可能匹配到同一文件，只处理一次
+    return [file_path for file_path in dict.fromkeys(files) if should_process_file(file_path)]
+
+
+def main():
+    manifest = load_manifest(RUN_CONFIG["manifest"])
+    fingerprint = rules_fingerprint()
+    pending = []
+    skipped = 0
+    files = []
+    for file_path in collect_files():
+        if not os.path.exists(file_path):
+            print(f"文件 {file_path} 不存在")
+            continue
+        files.append(file_path)
+
+    # 模板段落取决于整个语料，需要先扫描全部文件；文件中相关的模板段落变化时才重新清洗
+    boilerplate_fingerprints = {}
+    if BOILERPLATE_CONFIG["enabled"]:
+        boilerplate, owners, boilerplate_fingerprints = build_boilerplate_index(
+            files, FieldMatcher(JSON_CONFIG["fields"]))
+
+    for file_path in files:
+        unchanged, stat, digest = is_unchanged(file_path, manifest.get(file_path), fingerprint)
+        if unchanged and manifest[file_path].get("boilerplate") != boilerplate_fingerprints.get(file_path):
+            unchanged = False
+        if unchanged and not RUN_CONFIG["force"]:
+            # 内容没变但时间戳变了，更新清单，下次无需再算哈希
+            entry = manifest[file_path]
+            if entry["rules"] != fingerprint:
+                hits = dict(zip(entry["rules"], entry["hits"]))
+                entry["hits"] = [hits[rule] for rule in fingerprint]
+            entry.update(size=stat.st_size, mtime_ns=stat.st_mtime_ns, rules=fingerprint)
+            skipped += 1
+            continue
+        pending.append((file_path, stat, digest))
+
+    results = []
+    workers = RUN_CONFIG["workers"] or os.cpu_count() or 1
+    paths = [file_path for file_path, _, _ in pending]
+    if BOILERPLATE_CONFIG["enabled"]:
+        boilerplate_args = [(boilerplate, owners[file_path]) for file_path in paths]
+    else:
+        boilerplate_args = [None] * len(paths)
+    if len(pending) > 1 and workers > 1:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=min(workers, len(pending))) as pool:
+            outcomes = pool.map(process_file, paths, boilerplate_args)
+            results = list(zip(pending, outcomes))
+    else:
+        results = list(zip(pending, map(process_file, paths, boilerplate_args)))
+
+    for (file_path, stat, digest), result in results:
+        if result is None:
+            manifest.pop(file_path, None)
+            continue
+        manifest[file_path] = {
+            "sha256": digest or file_digest(file_path),
+            "size": stat.st_size,
+            "mtime_ns": stat.st_mtime_ns,
+            "rules": fingerprint,
+            "hits": [hits for _, hits, _ in result["rules"]],
+            "boilerplate": boilerplate_fingerprints.get(file_path),
+            "json": json_fingerprint(file_path),
+            "output": result["output"],
+        }
+    save_manifest(RUN_CONFIG["manifest"], manifest)
+
+    print(f"清洗文件{len(pending)}个, 未变化跳过{skipped}个")
+    if BOILERPLATE_CONFIG["enabled"]:
+        print(f"去除模板段落共{sum(result['boilerplate_removed'] for _, result in results if result)}处")
+    print_rule_report([result for _, result in results if result])
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,289 @@
+import os
+import re
+import json
+import math
+import time
+import argparse
+from functools import lru_cache
+
+# 把爬虫输出（或 clean-data.py 清洗后的文件）按模型上下文窗口切成带元数据的 JSONL 块。
+# 切分优先落在标题和段落边界；token 数默认用近似计数器估算，可换成 tiktoken。
+
+PAGE_SEPARATOR = '---'
+PAGE_TITLE_RE = re.compile(r'^## (.*)$')
+PAGE_META_RE = re.compile(r'^\(本页字数: \d+, URL: ([^)]+)\)(?:---)?$')
+FILE_HEADER_RE = re.compile(r'^# .*\(共\d+页, 全文\d+字\)\s*$')
+HEADING_RE = re.compile(r'^(#{1,6})\s+(.*)$')
+SENTENCE_RE = re.compile(r'.*?(?:[。！？!?；;]|\.(?=\s|$))\s*|.+$', re.S)
+
+_CJK_RANGES = '\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uf900-\ufaff'
+_CJK_RE = re.compile(f'[{_CJK_RANGES}]')
+_WORD_RE = re.compile(f'[^\\W{_CJK_RANGES}]+')
+_SYMBOL_RE = re.compile(r'[^\w\s]')
+
+
+def approximate_tokens(text):
+    """Estimate BPE token count: one per CJK character, about four characters per word piece, one per symbol."""
+    cjk = len(_CJK_RE.findall(text))
+    words = sum(math.ceil(len(word) / 4) for word in _WORD_RE.findall(text))
+    symbols = len(_SYMBOL_RE.findall(text))
+    return cjk + words + symbols
+
+
+def make_token_counter(spec='approx', cache_size=1 << 16):
+    """Return a cached text -> token count function for 'approx' or 'tiktoken:<encoding>'."""
+    if spec == 'approx':
+        count = approximate_tokens
+    elif spec.startswith('tiktoken:'):
+        try:
+            import tiktoken
+        except ImportError:
+            raise SystemExit("tiktoken is not installed; use --tokenizer approx or pip install tiktoken")
+        encoding = tiktoken.get_encoding(spec.split(':', 1)[1])
+
+        def count(text):
+            return len(encoding.encode(text, disallowed_special=()))
+    else:
+        raise ValueError(f"Unsupported tokenizer: {spec}")
+    # 段落和模板行在语料中大量重复，缓存计数结果
+    return lru_cache(maxsize=cache_size)(count)
+
+
+def iter_documents(file_path):
+    """Yield (url, title, lines) for each page in a crawler output, JSONL export or plain text file."""
+    default_title = os.path.splitext(os.path.basename(file_path))[0]
+    with open(file_path, 'r', encoding='utf-8') as f:
+        if file_path.endswith('.jsonl'):
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                if not isinstance(record, dict) or not isinstance(record.get('content'), str):
+                    continue
+                yield record.get('url'), record.get('title') or default_title, record['content'].splitlines()
+            return
+
+        url, title, lines = None, None, []
+        previous = ''
+        for number, line in enumerate(f):
+            line = line.rstrip('\n')
+            if number == 0 and FILE_HEADER_RE.match(line):
+                # 爬虫输出文件第一行是全文件的页数/字数头，不属于任何页面
+                continue
+            # 页面用 '---\n'.join 拼接，分隔符接在上一页最后一行末尾，下一行是 "## 标题"
+            if previous.endswith(PAGE_SEPARATOR) and PAGE_TITLE_RE.match(line):
+                if lines:
+                    lines[-1] = lines[-1][:-len(PAGE_SEPARATOR)]
+                if lines or title:
+                    yield url, title or default_title, lines
+                url, title, lines = None, None, []
+            if number == 1 and title is None and len(lines) == 1 and lines[0].startswith('# ') \
+                    and PAGE_TITLE_RE.match(line):
+                # 清洗后的文件头去掉了页数/字数，只能根据紧跟的页面标题识别
+                lines = []
+            previous = line
+            if not lines and title is None:
+                match = PAGE_TITLE_RE.match(line)
+                if match:
+                    title = match.group(1).strip()
+                    continue
+            if not lines and url is None:
+                match = PAGE_META_RE.match(line)
+                if match:
+                    url = match.group(1)
+                    continue
+            lines.append(line)
+        if lines or title:
+            yield url, title or default_title, lines
+
+
+def split_by_length(text, max_tokens, count_tokens):
+    """Cut text into pieces of at most max_tokens, estimating cut points from the characters-per-token ratio."""
+    pieces = []
+    while text:
+        ratio = len(text) / max(1, count_tokens(text))
+        step = max(1, int(max_tokens * ratio))
+        piece = text[:step]
+        tokens = count_tokens(piece)
+        # 估算的切点可能偏大，按实际 token 数缩短直到放得下
+        while step > 1 and tokens > max_tokens:
+            step = max(1, min(step - 1, step * max_tokens // tokens))
+            piece = text[:step]
+            tokens = count_tokens(piece)
+        pieces.append(piece)
+        text = text[step:]
+    return pieces
+
+
+def split_oversized(text, max_tokens, count_tokens):
+    """Split a paragraph longer than max_tokens at sentence ends, then by length."""
+    pieces = []
+    current = ''
+    for sentence in SENTENCE_RE.findall(text):
+        if not sentence:
+            continue
+        if count_tokens(sentence) > max_tokens:
+            if current:
+                pieces.append(current)
+                current = ''
+            # 单句仍然过长：按长度切开
+            pieces.extend(split_by_length(sentence, max_tokens, count_tokens))
+            continue
+        candidate = current + sentence
+        if current and count_tokens(candidate) > max_tokens:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+class Chunker:
+    """Pack paragraphs into chunks of at most max_tokens, breaking before headings when reasonably full."""
+
+    def __init__(self, max_tokens=1024, overlap_tokens=128, count_tokens=None, heading_break_ratio=0.5):
+        if overlap_tokens >= max_tokens:
+            raise ValueError("overlap_tokens must be smaller than max_tokens")
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+        self.count_tokens = count_tokens or make_token_counter()
+        self.heading_break_ratio = heading_break_ratio
+
+    def units(self, lines):
+        """Yield (text, tokens, heading path, is_heading) paragraph units."""
+        headings = []
+        paragraph = []
+
+        def flush():
+            text = '\n'.join(paragraph).strip()
+            paragraph.clear()
+            if not text:
+                return
+            tokens = self.count_tokens(text)
+            if tokens <= self.max_tokens:
+                yield text, tokens, tuple(headings), False
+                return
+            for piece in split_oversized(text, self.max_tokens, self.count_tokens):
+                yield piece, self.count_tokens(piece), tuple(headings), False
+
+        for line in lines:
+            match = HEADING_RE.match(line)
+            if match:
+                yield from flush()
+                level = len(match.group(1))
+                del headings[level - 1:]
+                headings.extend([''] * (level - 1 - len(headings)))
+                headings.append(match.group(2).strip())
+                heading = line.strip()
+                tokens = self.count_tokens(heading)
+                if tokens <= self.max_tokens:
+                    yield heading, tokens, tuple(headings), True
+                else:
+                    # 超长标题按正文切开输出，不能因为放不进任何块而丢掉
+                    for piece in split_oversized(heading, self.max_tokens, self.count_tokens):
+                        yield piece, self.count_tokens(piece), tuple(headings), False
+            elif not line.strip():
+                yield from flush()
+            else:
+                # 爬虫输出已去掉空行：行尾是句末标点时结束段落，列表、代码等连续行合在一起
+                paragraph.append(line)
+                if line.rstrip().endswith(('。', '.', '!', '?', '！', '？', ':', '：')):
+                    yield from flush()
+        yield from flush()
+
+    def chunks(self, lines):
+        """Yield (text, tokens, heading path) chunks for one document."""
+        current = []
+        total = 0
+        fresh = False  # 当前块里是否有不属于重叠部分的正文
+        for text, tokens, headings, is_heading in self.units(lines):
+            full = total + tokens > self.max_tokens
+            heading_break = is_heading and total >= self.heading_break_ratio * self.max_tokens
+            if current and fresh and (full or heading_break):
+                yield self._emit(current)
+                # 在标题处断开时新块从标题开始，不需要重叠
+                current = [] if heading_break else self._overlap(current)
+                total = sum(unit[1] for unit in current)
+                while current and total + tokens > self.max_tokens:
+                    total -= current.pop(0)[1]
+                fresh = False
+            elif full:
+                # 块里只有标题或重叠部分时不能切块，去掉开头的单元直到下一段放得下
+                while current and total + tokens > self.max_tokens:
+                    total -= current.pop(0)[1]
+            current.append((text, tokens, headings))
+            total += tokens
+            fresh = fresh or not is_heading
+        if fresh:
+            yield self._emit(current)
+
+    def _overlap(self, units):
+        """Trailing units, totalling at most overlap_tokens, repeated at the start of the next chunk."""
+        kept = []
+        total = 0
+        for unit in reversed(units):
+            if total + unit[1] > self.overlap_tokens:
+                break
+            kept.insert(0, unit)
+            total += unit[1]
+        return kept
+
+    def _emit(self, units):
+        text = '\n'.join(unit[0] for unit in units)
+        return text, sum(unit[1] for unit in units), list(units[0][2])
+
+
+def chunk_files(paths, output, chunker):
+    """Chunk every document of every input file and stream the chunks to a JSONL file."""
+    stats = {'files': 0, 'documents': 0, 'chunks': 0, 'tokens': 0}
+    with open(output, 'w', encoding='utf-8') as out:
+        for path in paths:
+            stats['files'] += 1
+            for doc_number, (url, title, lines) in enumerate(iter_documents(path)):
+                stats['documents'] += 1
+                for chunk_number, (text, tokens, headings) in enumerate(chunker.chunks(lines)):
+                    out.write(json.dumps({
+                        'id': f"{os.path.basename(path)}:{doc_number}:{chunk_number}",
+                        'source': path,
+                        'url': url,
+                        'title': title,
+                        'headings': [heading for heading in headings if heading],
+                        'chunk': chunk_number,
+                        'tokens': tokens,
+                        'content': text,
+                    }, ensure_ascii=False) + '\n')
+                    stats['chunks'] += 1
+                    stats['tokens'] += tokens
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split crawled or cleaned text into token-bounded JSONL chunks.")
+    parser.add_argument('inputs', nargs='+', help="crawler output (.txt/.md), JSONL exports or cleaned files")
+    parser.add_argument('-o', '--output', help="output JSONL file (default: <first input>-chunks.jsonl)")
+    parser.add_argument('--max-tokens', type=int, default=1024, help="maximum tokens per chunk")
+    parser.add_argument('--overlap', type=int, default=128, help="tokens repeated from the previous chunk")
+    parser.add_argument('--tokenizer', default='approx', help="'approx' or 'tiktoken:<encoding>', e.g. tiktoken:cl100k_base")
+    args = parser.parse_args()
+
+    missing = [path for path in args.inputs if not os.path.isfile(path)]
+    if missing:
+        parser.error(f"文件不存在: {', '.join(missing)}")
+    output = args.output or f"{os.path.splitext(args.inputs[0])[0]}-chunks.jsonl"
+    chunker = Chunker(args.max_tokens, args.overlap, make_token_counter(args.tokenizer))
+
+    start = time.perf_counter()
+    stats = chunk_files(args.inputs, output, chunker)
+    elapsed = time.perf_counter() - start
+    print(f"处理文件{stats['files']}个, 页面{stats['documents']}个, 生成{stats['chunks']}块, "
+          f"共{stats['tokens']}个token, 耗时{elapsed:.2f}秒")
+    print(f"结果保存为: {output}")
+
+
+if __name__ == "__main__":
+    main()
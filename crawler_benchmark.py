@@ -0,0 +1,244 @@
+import os
+import sys
+import json
+import time
+import random
+import logging
+import argparse
+import resource
+import tempfile
+import importlib
+import subprocess
+import multiprocessing
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Offline benchmark for WebCrawler: serves a synthetic documentation site from a local
+# HTTP server and reports throughput, latency percentiles, peak RSS and CPU time.
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+WORDS = [
+    'api', 'request', 'response', 'token', 'client', 'server', 'message', 'thread', 'label', 'draft',
+    'quota', 'scope', 'batch', 'error', 'field', 'method', 'resource', 'payload', 'header', 'query',
+    'parameter', 'object', 'string', 'integer', 'boolean', 'array', 'version', 'release', 'guide', 'sample',
+    'install', 'configure', 'deploy', 'service', 'account', 'permission', 'callback', 'event', 'stream', 'cache',
+]
+
+
+class SyntheticSite:
+    """Deterministic documentation site: pages, links, nav menu, slow/error pages and duplicates."""
+
+    def __init__(self, pages=500, fanout=8, page_size=8000, nav_size=30, slow_ratio=0.0, slow_delay=0.5,
+                 error_ratio=0.0, duplicate_ratio=0.0, seed=42):
+        self.pages = pages
+        self.fanout = fanout
+        self.page_size = page_size
+        self.nav_size = nav_size
+        self.slow_delay = slow_delay
+        self.seed = seed
+        rng = random.Random(seed)
+        self.slow_pages = {i for i in range(1, pages) if rng.random() < slow_ratio}
+        self.error_pages = {i for i in range(1, pages) if rng.random() < error_ratio}
+        # 重复页面：不同 URL，内容与某个正常页面相同
+        self.duplicates = {f"dup-{i}": i for i in range(pages) if rng.random() < duplicate_ratio}
+
+    def links(self, number):
+        rng = random.Random(self.seed * 7919 + number)
+        targets = [(number + 1) % self.pages] + [rng.randrange(self.pages) for _ in range(self.fanout - 1)]
+        dup_names = [name for name, original in self.duplicates.items() if original == (number + 1) % self.pages]
+        return [f"/docs/page-{target}.html" for target in targets] + [f"/docs/{name}.html" for name in dup_names]
+
+    def render(self, number):
+        rng = random.Random(self.seed * 104729 + number)
+        nav = ''.join(f'<li><a href="/docs/page-{i}.html">Page {i}</a></li>' for i in range(self.nav_size))
+        paragraphs = []
+        size = 0
+        while size < self.page_size:
+            sentence = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(8, 20)))
+            paragraph = f"<p>Section {number}.{len(paragraphs)}: {sentence}.</p>"
+            paragraphs.append(paragraph)
+            size += len(paragraph)
+        links = ''.join(f'<li><a href="{href}">{href}</a></li>' for href in self.links(number))
+        return (f"<!DOCTYPE html><html><head><meta charset=\"utf-8\"><title>Page {number} | Synthetic Docs</title>"
+                f"</head><body><header><a href=\"/docs/page-0.html\">Home</a></header>"
+                f"<nav class=\"table-of-contents\"><ul>{nav}</ul></nav>"
+                f"<main><article><h1>Synthetic page {number}</h1>{''.join(paragraphs)}"
+                f"<h2>See also</h2><ul>{links}</ul></article></main>"
+                f"<footer>Copyright synthetic docs</footer></body></html>").encode('utf-8')
+
+    def resolve(self, path):
+        """Return (status, page number or None) for a request path."""
+        name = path.split('?', 1)[0].rsplit('/', 1)[-1]
+        if not name.endswith('.html'):
+            return 404, None
+        name = name[:-len('.html')]
+        if name in self.duplicates:
+            return 200, self.duplicates[name]
+        if name.startswith('page-') and name[len('page-'):].isdigit():
+            number = int(name[len('page-'):])
+            if number >= self.pages:
+                return 404, None
+            if number in self.error_pages:
+                return 500, None
+            return 200, number
+        return 404, None
+
+
+def serve_site(site, port_queue):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            pass
+
+        def do_GET(self):
+            status, number = site.resolve(self.path)
+            if number in site.slow_pages:
+                time.sleep(site.slow_delay)
+            body = site.render(number) if status == 200 else b''
+            self.send_response(status)
+            self.send_header('Content-Type', 'text/html; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    port_queue.put(server.server_address[1])
+    server.serve_forever()
+
+
+def load_crawler_module():
+    # 爬虫脚本文件名带连字符，只能通过 importlib 加载；放进 sys.path 便于解析进程按模块名导入
+    if SCRIPT_DIR not in sys.path:
+        sys.path.insert(0, SCRIPT_DIR)
+    return importlib.import_module('data-for-llm-crawl')
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=SCRIPT_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def cpu_seconds(usage):
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_benchmark(args):
+    crawler_module = load_crawler_module()
+    site = SyntheticSite(args.pages, args.fanout, args.page_size, args.nav_size, args.slow_ratio, args.slow_delay,
+                         args.error_ratio, args.duplicate_ratio, args.seed)
+
+    port_queue = multiprocessing.Queue()
+    server = multiprocessing.Process(target=serve_site, args=(site, port_queue), daemon=True)
+    server.start()
+    port = port_queue.get(timeout=10)
+    base_url = f"http://127.0.0.1:{port}"
+
+    try:
+        with tempfile.TemporaryDirectory(prefix='crawler-bench-') as output_dir:
+            crawler = crawler_module.WebCrawler(
+                [f"{base_url}/docs/page-0.html"],
+                [rf"http://127\.0\.0\.1:{port}/docs/.*"],
+                [r".*\.(js|css|png|jpg|jpeg|gif|svg)$"],
+                max_urls=args.pages * 2,
+                max_workers=args.workers,
+                extract_workers=args.extract_workers,
+                output_format=args.output_format,
+                output_dir=output_dir,
+                crawl_delay=0,
+                max_retries=1,
+                retry_backoff=0.05,
+            )
+            self_before = resource.getrusage(resource.RUSAGE_SELF)
+            children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+            started = time.perf_counter()
+            crawler.crawl()
+            wall_time = time.perf_counter() - started
+            crawler.close()
+            crawler.save_results()
+            self_after = resource.getrusage(resource.RUSAGE_SELF)
+            # 解析进程池在 crawl 结束时已回收，计入 RUSAGE_CHILDREN；站点服务进程仍在运行，不计入
+            children_after = resource.getrusage(resource.RUSAGE_CHILDREN)
+            output_bytes = sum(os.path.getsize(shard) for shard in crawler.writer.shards)
+    finally:
+        server.terminate()
+        server.join()
+
+    metrics = crawler.metrics.report(crawler.pages_crawled)
+    stages = metrics['stages']
+    # ru_maxrss 在 Linux 上单位为 KB，在 macOS 上为字节
+    rss_unit = 1 if sys.platform == 'darwin' else 1024
+    return {
+        'revision': git_revision(),
+        'site': {
+            'pages': args.pages, 'fanout': args.fanout, 'page_size': args.page_size, 'nav_size': args.nav_size,
+            'slow_pages': len(site.slow_pages), 'error_pages': len(site.error_pages),
+            'duplicate_pages': len(site.duplicates), 'seed': args.seed,
+        },
+        'crawler': {'workers': args.workers, 'extract_workers': crawler.extract_workers,
+                    'output_format': args.output_format},
+        'pages_crawled': crawler.pages_crawled,
+        'duplicates_dropped': len(crawler.duplicates),
+        'wall_time': round(wall_time, 3),
+        'pages_per_sec': round(crawler.pages_crawled / wall_time, 3) if wall_time else 0.0,
+        'fetch_latency': stages.get('fetch.headers'),
+        'extract_latency': stages.get('extract.roundtrip'),
+        'cpu_time': {
+            'main': round(cpu_seconds(self_after) - cpu_seconds(self_before), 3),
+            'extract_workers': round(cpu_seconds(children_after) - cpu_seconds(children_before), 3),
+        },
+        'peak_rss_bytes': {
+            'main': self_after.ru_maxrss * rss_unit,
+            'largest_child': children_after.ru_maxrss * rss_unit,
+        },
+        'output_bytes': output_bytes,
+        'stages': stages,
+    }
+
+
+def print_summary(result):
+    print(f"revision: {result['revision']}")
+    print(f"pages crawled: {result['pages_crawled']} (duplicates dropped: {result['duplicates_dropped']})")
+    print(f"wall time: {result['wall_time']}s, throughput: {result['pages_per_sec']} pages/s")
+    for label, key in (('fetch latency', 'fetch_latency'), ('extract latency', 'extract_latency')):
+        latency = result[key]
+        if latency:
+            print(f"{label}: p50={latency['p50'] * 1000:.1f}ms p95={latency['p95'] * 1000:.1f}ms "
+                  f"p99={latency['p99'] * 1000:.1f}ms")
+    print(f"cpu time: main={result['cpu_time']['main']}s extract_workers={result['cpu_time']['extract_workers']}s")
+    print(f"peak rss: main={result['peak_rss_bytes']['main'] / 2 ** 20:.1f}MB "
+          f"largest_child={result['peak_rss_bytes']['largest_child'] / 2 ** 20:.1f}MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark WebCrawler against a local synthetic documentation site.")
+    parser.add_argument('--pages', type=int, default=500, help="number of distinct pages on the site")
+    parser.add_argument('--fanout', type=int, default=8, help="links from each page to other pages")
+    parser.add_argument('--page-size', type=int, default=8000, help="approximate body bytes per page")
+    parser.add_argument('--nav-size', type=int, default=30, help="links in the nav.table-of-contents menu")
+    parser.add_argument('--slow-ratio', type=float, default=0.0, help="fraction of pages that respond slowly")
+    parser.add_argument('--slow-delay', type=float, default=0.5, help="delay in seconds for slow pages")
+    parser.add_argument('--error-ratio', type=float, default=0.0, help="fraction of pages that return HTTP 500")
+    parser.add_argument('--duplicate-ratio', type=float, default=0.0, help="fraction of pages with a duplicate URL")
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--workers', type=int, default=10, help="crawler max_workers")
+    parser.add_argument('--extract-workers', type=int, default=None, help="crawler extract_workers")
+    parser.add_argument('--output-format', choices=('markdown', 'jsonl'), default='markdown')
+    parser.add_argument('--output', help="append the result as a JSON line to this file")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.ERROR)
+    result = run_benchmark(args)
+    print_summary(result)
+    if args.output:
+        with open(args.output, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(result, ensure_ascii=False) + '\n')
+        print(f"Result appended to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,201 +1,1809 @@
 import requests
-from newspaper import Article
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from requests.compat import chardet
+from newspaper import Article, Config as NewspaperConfig
+from newspaper.parsers import Parser as NewspaperParser
+from newspaper.extractors import ContentExtractor as NewspaperExtractor
+import lxml.html
+import lxml.etree
 import re
+import copy
 import concurrent.futures
+import threading
 import time
+import json
 import logging
+import argparse
+import sqlite3
+import heapq
+import math
+import random
+from email.utils import parsedate_to_datetime
+from collections import deque, OrderedDict, namedtuple, Counter
 from urllib.parse import urljoin, urlparse, urlunparse
+from urllib.robotparser import RobotFileParser
 import os
+import hashlib
+import codecs
+import gzip
+import io
 import html2text
-from datetime import datetime
+try:
+    from re import _parser as sre_parse, _constants as sre_constants
+except ImportError:  # Python < 3.11
+    import sre_parse
+    import sre_constants
+from datetime import datetime, timezone
 import gne
+from gne.utils import pre_parse, remove_noise_node
 import kuser_agent
 
+CONFIG_FILE = "crawler_config.json"
+
+
+def load_config(path=CONFIG_FILE):
+    """Load crawler settings from a JSON file, returning {} if it does not exist."""
+    if not os.path.exists(path):
+        return {}
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+_BOMS = (
+    (codecs.BOM_UTF32_LE, 'utf-32'), (codecs.BOM_UTF32_BE, 'utf-32'),
+    (codecs.BOM_UTF8, 'utf-8-sig'), (codecs.BOM_UTF16_LE, 'utf-16'), (codecs.BOM_UTF16_BE, 'utf-16'),
+)
+_HEADER_CHARSET_RE = re.compile(r'charset\s*=\s*["\']?([\w.:-]+)', re.I)
+_META_CHARSET_RE = re.compile(rb'<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)', re.I)
+# 与浏览器一致：声明为这些编码的页面实际按其超集解码
+_ENCODING_ALIASES = {'gb2312': 'gb18030', 'gbk': 'gb18030', 'iso-8859-1': 'cp1252', 'latin-1': 'cp1252',
+                     'ascii': 'cp1252', 'us-ascii': 'cp1252', 'big5': 'big5hkscs', 'shift_jis': 'cp932'}
+
+
+def _codec(name):
+    if not name:
+        return None
+    name = name.strip().lower()
+    name = _ENCODING_ALIASES.get(name, name)
+    try:
+        return codecs.lookup(name).name
+    except LookupError:
+        return None
+
+
+def decode_html(content, content_type=None, sniff_bytes=4096, sample_bytes=65536):
+    """Decode an HTML body; returns (text, encoding, method).
+
+    Tries, in order: byte-order mark, charset in the Content-Type header, <meta charset> within the
+    first sniff_bytes, strict UTF-8, and finally statistical detection on at most sample_bytes.
+    """
+    for bom, encoding in _BOMS:
+        if content.startswith(bom):
+            return content.decode(encoding, errors='replace'), encoding, 'bom'
+
+    match = _HEADER_CHARSET_RE.search(content_type or '')
+    encoding = _codec(match.group(1)) if match else None
+    if encoding:
+        return content.decode(encoding, errors='replace'), encoding, 'header'
+
+    match = _META_CHARSET_RE.search(content[:sniff_bytes])
+    encoding = _codec(match.group(1).decode('ascii', 'ignore')) if match else None
+    if encoding:
+        return content.decode(encoding, errors='replace'), encoding, 'meta'
+
+    try:
+        return content.decode('utf-8'), 'utf-8', 'utf-8'
+    except UnicodeDecodeError:
+        pass
+
+    # 只对有限长度的样本做统计检测，耗时不随页面大小增长
+    encoding = _codec(chardet.detect(content[:sample_bytes]).get('encoding')) or 'utf-8'
+    return content.decode(encoding, errors='replace'), encoding, 'detect'
+
+
+class HttpCache:
+    """On-disk cache of page bodies plus ETag/Last-Modified validators, keyed by normalized URL."""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def _paths(self, url):
+        key = hashlib.sha1(url.encode('utf-8')).hexdigest()
+        base = os.path.join(self.cache_dir, key[:2], key)
+        return f"{base}.json", f"{base}.body"
+
+    def get(self, url):
+        meta_path, body_path = self._paths(url)
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if meta.get('url') != url or not os.path.exists(body_path):
+            return None
+        return meta
+
+    def conditional_headers(self, meta):
+        headers = {}
+        if meta.get('etag'):
+            headers['If-None-Match'] = meta['etag']
+        if meta.get('last_modified'):
+            headers['If-Modified-Since'] = meta['last_modified']
+        return headers
+
+    def read_body(self, url):
+        _, body_path = self._paths(url)
+        with open(body_path, 'rb') as f:
+            return f.read()
+
+    def store(self, url, response):
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+        meta_path, body_path = self._paths(url)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        meta = {
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'encoding': response.encoding,
+            'fetched_at': time.time(),
+        }
+        self._atomic_write(body_path, response.content)
+        self._atomic_write(meta_path, json.dumps(meta, ensure_ascii=False).encode('utf-8'))
+
+    @staticmethod
+    def _atomic_write(path, data):
+        # 先写临时文件再替换，避免并发或中断时留下半截缓存
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+
+class PageArchive:
+    """Content-addressed store of raw fetched pages (gzip, keyed by SHA-256) with a URL manifest."""
+
+    def __init__(self, archive_dir):
+        self.archive_dir = archive_dir
+        self.manifest_path = os.path.join(archive_dir, 'manifest.jsonl')
+        os.makedirs(archive_dir, exist_ok=True)
+        self.lock = threading.Lock()
+
+    def blob_path(self, digest):
+        return os.path.join(self.archive_dir, 'objects', digest[:2], f"{digest}.gz")
+
+    def store(self, url, body, status, content_type=None, encoding=None):
+        """Archive a page body; identical bodies are stored once. Returns the content hash."""
+        digest = hashlib.sha256(body).hexdigest()
+        path = self.blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            HttpCache._atomic_write(path, gzip.compress(body, compresslevel=6))
+        record = {
+            'url': url,
+            'sha256': digest,
+            'size': len(body),
+            'status': status,
+            'content_type': content_type,
+            'encoding': encoding,
+            'fetched_at': time.time(),
+        }
+        # manifest 只追加，同一 URL 以最后一条为准
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+        with self.lock:
+            with open(self.manifest_path, 'a', encoding='utf-8') as f:
+                f.write(line)
+        return digest
+
+    def read(self, digest):
+        with open(self.blob_path(digest), 'rb') as f:
+            return gzip.decompress(f.read())
+
+    def entries(self):
+        """Return the latest manifest record per URL, in first-fetched order."""
+        latest = OrderedDict()
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 中断时可能留下半行
+                        continue
+                    latest[record['url']] = record
+        except FileNotFoundError:
+            pass
+        return list(latest.values())
+
+
+def parse_lastmod(value):
+    """Parse a sitemap <lastmod> (W3C datetime) into a Unix timestamp, or None."""
+    value = (value or '').strip()
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.timestamp()
+
+
+def iter_sitemap(source):
+    """Stream (kind, loc, lastmod) from a sitemap or sitemap index; kind is 'url' or 'sitemap'."""
+    for _, elem in lxml.etree.iterparse(source, events=('end',), huge_tree=True):
+        if not isinstance(elem.tag, str):
+            continue
+        kind = lxml.etree.QName(elem).localname
+        if kind not in ('url', 'sitemap'):
+            continue
+        loc = lastmod = None
+        for child in elem:
+            if not isinstance(child.tag, str):
+                continue
+            name = lxml.etree.QName(child).localname
+            if name == 'loc':
+                loc = (child.text or '').strip()
+            elif name == 'lastmod':
+                lastmod = parse_lastmod(child.text)
+        if loc:
+            yield kind, loc, lastmod
+        # 释放已处理的节点，大 sitemap 也只占用常数内存
+        elem.clear()
+        while elem.getprevious() is not None:
+            del elem.getparent()[0]
+
+
+_REGEX_SPECIAL = set('.^$*+?{}[]|()')
+
+
+def has_alternation(pattern):
+    """True if the regex contains a '|' that is neither escaped nor inside a character class."""
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == '\\':
+            i += 2
+            continue
+        if ch == '[':
+            # 字符类内的 '|' 是普通字符；开头的 ']' 或 '^]' 也属于字符类
+            i += 1
+            if i < len(pattern) and pattern[i] == '^':
+                i += 1
+            if i < len(pattern) and pattern[i] == ']':
+                i += 1
+            while i < len(pattern) and pattern[i] != ']':
+                i += 2 if pattern[i] == '\\' else 1
+        elif ch == '|':
+            return True
+        i += 1
+    return False
+
+
+def has_group_reference(pattern):
+    """True if the regex refers back to its own groups (\\1, (?P=name), (?(1)...)).
+
+    Inside a combined alternation its groups are renumbered, so such references would point elsewhere.
+    """
+    pending = [sre_parse.parse(pattern)]
+    while pending:
+        item = pending.pop()
+        if isinstance(item, sre_parse.SubPattern):
+            for op, av in item:
+                if op in (sre_constants.GROUPREF, sre_constants.GROUPREF_EXISTS):
+                    return True
+                pending.append(av)
+        elif isinstance(item, (tuple, list)):
+            pending.extend(item)
+    return False
+
+
+def literal_prefix(pattern):
+    """Return the literal text every match of the regex must start with ('' if unknown)."""
+    if has_alternation(pattern):
+        return ''
+    prefix = []
+    i = 1 if pattern.startswith('^') else 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if ch == '\\' and i + 1 < len(pattern) and not pattern[i + 1].isalnum():
+            prefix.append(pattern[i + 1])
+            i += 2
+            continue
+        if ch in '*?{' and prefix:
+            # 前一个字符可以出现 0 次，不能算入前缀
+            prefix.pop()
+        if ch in _REGEX_SPECIAL or ch == '\\':
+            break
+        prefix.append(ch)
+        i += 1
+    return ''.join(prefix)
+
+
+class PatternSet:
+    """A list of regexes compiled into alternations, prefiltered by a trie of their literal prefixes."""
+
+    _END = object()
+
+    def __init__(self, patterns):
+        self.trie = {}
+        prefixed, unprefixed = [], []
+        for pattern in patterns:
+            prefix = literal_prefix(pattern)
+            if not prefix:
+                unprefixed.append(pattern)
+                continue
+            prefixed.append(pattern)
+            node = self.trie
+            for ch in prefix:
+                node = node.setdefault(ch, {})
+            node[self._END] = True
+        self.prefixed = self._compile(prefixed)
+        self.unprefixed = self._compile(unprefixed)
+
+    @staticmethod
+    def _compile(patterns):
+        # 带分组反向引用的模式合并后编号会变，单独编译
+        separate = [p for p in patterns if has_group_reference(p)]
+        combined = [p for p in patterns if p not in separate]
+        regexes = [re.compile(p) for p in separate]
+        if not combined:
+            return regexes
+        try:
+            return [re.compile('|'.join(f'(?:{p})' for p in combined))] + regexes
+        except re.error:
+            # 合并后无法编译（例如组名重复）时退回逐个编译
+            return [re.compile(p) for p in combined] + regexes
+
+    def _prefix_hit(self, url):
+        node = self.trie
+        for ch in url:
+            node = node.get(ch)
+            if node is None:
+                return False
+            if self._END in node:
+                return True
+        return False
+
+    def match(self, url):
+        if self.prefixed and self._prefix_hit(url):
+            if any(regex.match(url) for regex in self.prefixed):
+                return True
+        return any(regex.match(url) for regex in self.unprefixed)
+
+
+class UrlMatcher:
+    """Decide ignore/valid/invalid for URLs, with a bounded LRU of past decisions."""
+
+    IGNORE, VALID, INVALID = 'ignore', 'valid', 'invalid'
+
+    def __init__(self, url_patterns, ignore_patterns, cache_size=100000):
+        self.url_set = PatternSet(url_patterns)
+        self.ignore_set = PatternSet(ignore_patterns)
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = {'calls': 0, 'cache_hits': 0, 'match_time': 0.0}
+
+    def decide(self, url):
+        with self.lock:
+            self.stats['calls'] += 1
+            decision = self.cache.get(url)
+            if decision is not None:
+                self.cache.move_to_end(url)
+                self.stats['cache_hits'] += 1
+                return decision
+
+        start = time.perf_counter()
+        if self.ignore_set.match(url):
+            decision = self.IGNORE
+        elif self.url_set.match(url):
+            decision = self.VALID
+        else:
+            decision = self.INVALID
+        elapsed = time.perf_counter() - start
+
+        with self.lock:
+            self.stats['match_time'] += elapsed
+            self.cache[url] = decision
+            if len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        return decision
+
+
+class ParsedPage:
+    """A page parsed once with lxml and shared by link extraction and every content extractor."""
+
+    # 与原先 BeautifulSoup 的优先级一致：article > main > div.content
+    MAIN_CONTENT_XPATHS = ('//article', '//main',
+                           '//div[contains(concat(" ", normalize-space(@class), " "), " content ")]')
+    MENU_XPATH = '//nav[contains(concat(" ", normalize-space(@class), " "), " table-of-contents ")]'
+
+    def __init__(self, url, html):
+        self.url = url
+        self.html = html
+        try:
+            # lxml 不接受带 encoding 声明的 unicode 字符串，与 newspaper 的处理保持一致
+            if html.startswith('<?'):
+                html = re.sub(r'^\<\?.*?\?\>', '', html, flags=re.DOTALL)
+            self.doc = lxml.html.document_fromstring(html)
+        except (lxml.etree.ParserError, ValueError):
+            self.doc = None
+
+    def copy_doc(self):
+        """Return a private copy of the tree for extractors that modify it in place."""
+        return copy.deepcopy(self.doc) if self.doc is not None else None
+
+    def title(self):
+        if self.doc is None:
+            return ''
+        return (self.doc.findtext('.//title') or '').strip()
+
+    def main_content(self):
+        """Return the article/main/div.content element, falling back to <body>."""
+        if self.doc is None:
+            return None
+        for xpath in self.MAIN_CONTENT_XPATHS:
+            found = self.doc.xpath(xpath)
+            if found:
+                return found[0]
+        return self.doc.find('body')
+
+    def anchors(self):
+        """Yield every <a href> once, left-menu links first."""
+        if self.doc is None:
+            return []
+        menu = self.doc.xpath(self.MENU_XPATH)
+        menu_anchors = [a for a in menu[0].iter('a') if a.get('href') is not None] if menu else []
+        menu_set = set(menu_anchors)
+        return menu_anchors + [a for a in self.doc.iter('a')
+                               if a.get('href') is not None and a not in menu_set]
+
+    @staticmethod
+    def to_html(element):
+        return lxml.html.tostring(element, encoding='unicode')
+
+
+class SharedDomParser(NewspaperParser):
+    """newspaper parser that returns the tree already built by ParsedPage instead of reparsing."""
+
+    local = threading.local()
+
+    @classmethod
+    def fromstring(cls, html):
+        doc = getattr(cls.local, 'doc', None)
+        if doc is not None:
+            cls.local.doc = None
+            return doc
+        return super().fromstring(html)
+
+
+def normalize_url(url):
+    """Remove hash fragment from URL and normalize it."""
+    parsed = urlparse(url)
+    return urlunparse(parsed._replace(fragment=''))
+
+
+EXTRACTOR_ORDER = ('newspaper', 'gne', 'html2text')
+
+
+class ContentExtractor:
+    """CPU-bound page extraction (newspaper3k, GNE, html2text, cleanup), independent of crawl state."""
+
+    def __init__(self):
+        self.text_maker = html2text.HTML2Text()
+        self.text_maker.bypass_tables = False
+        self.text_maker.mark_code = True
+        self.text_maker.code = True
+        self.text_maker.body_width = 0  # 防止自动换行
+
+        self.gne_extractor = gne.GeneralNewsExtractor()
+
+        self.newspaper_config = NewspaperConfig()
+        self.newspaper_config.fetch_images = False
+        self.newspaper_config.memoize_articles = False
+        self.newspaper_config.get_parser = lambda: SharedDomParser
+
+    def page_links(self, url, page):
+        """Return the page's absolute, normalized links once each, left-menu links first."""
+        links = []
+        seen = set()
+        for a_tag in page.anchors():
+            try:
+                normalized_link = normalize_url(urljoin(url, a_tag.get('href')))
+            except ValueError:
+                # 单个畸形链接（如 http://[broken）只跳过该链接，不能让整页提取失败
+                continue
+            if normalized_link not in seen:
+                seen.add(normalized_link)
+                links.append(normalized_link)
+        return links
+
+    def extract_gne(self, page):
+        """Run GNE on a copy of the shared tree (same steps as GeneralNewsExtractor.extract)."""
+        element = page.copy_doc()
+        if element is None:
+            return None
+        # GNE 原本在文本层面去掉 <br>，这里直接在树上删除，保留其后的文本
+        for br in element.xpath('//br'):
+            br.drop_tree()
+        extractor = self.gne_extractor
+        title = extractor._title_extractor.extract(element, title_xpath='')
+        remove_noise_node(element, None)
+        element = pre_parse(element)
+        content = extractor._content_extractor.extract(element, host='', with_body_html=False,
+                                                       body_xpath='', use_visiable_info=False)
+        if not content:
+            return None
+        return {'title': title, 'content': content[0][1]['text']}
+
+    def extract_newspaper(self, url, html, page):
+        article = Article(url, config=self.newspaper_config)
+        article.set_html(html)
+        SharedDomParser.local.doc = page.copy_doc()
+        try:
+            article.parse()
+        finally:
+            SharedDomParser.local.doc = None
+        return article.title, article.text
+
+    def extract_html2text(self, page):
+        # 找不到 article/main/div.content 时使用整个 body
+        main_content = page.main_content()
+        if main_content is None:
+            return ''
+        return self.text_maker.handle(page.to_html(main_content))
+
+    def extract_content(self, url, html, page=None, order=EXTRACTOR_ORDER):
+        title, content, _ = self.run_extractors(url, html, page, order)
+        return title, content
+
+    def run_extractors(self, url, html, page=None, order=EXTRACTOR_ORDER, timings=None):
+        """Try the extractors in order until one yields text; returns (title, content, winning extractor).
+
+        If timings is a dict, the seconds spent in each step are added to it under "extract.<step>".
+        """
+        timings = {} if timings is None else timings
+        page = page or ParsedPage(url, html)
+        title = None
+        content = ''
+        winner = None
+        # 默认顺序：newspaper3k -> GNE -> 直接把已解析的正文节点交给 html2text
+        for name in order:
+            start = time.perf_counter()
+            if name == 'newspaper':
+                title, text = self.extract_newspaper(url, html, page)
+            elif name == 'gne':
+                gne_result = self.extract_gne(page)
+                text = gne_result['content'] if gne_result and gne_result['title'] else ''
+            else:
+                text = self.extract_html2text(page)
+            timings[f'extract.{name}'] = time.perf_counter() - start
+            if text and text.strip():
+                content = text
+                winner = name
+                break
+
+        start = time.perf_counter()
+        # 标题始终沿用 newspaper 的规则；跳过 newspaper 时只在已解析的 DOM 上取标题
+        if title is None and page.doc is not None:
+            title = NewspaperExtractor(self.newspaper_config).get_title(page.doc)
+        title = title if title else "未取到标题"
+
+        # 如果所有方法都失败，添加提示信息
+        if not content.strip():
+            content = "未能提取到网页正文"
+
+        # 移除非内容的HTML代码
+        content = re.sub(r'<ph[^>]*>.*?</ph>', '', content)
+
+        # 处理内容，保留段落结构但移除多余的空行
+        lines = content.split('\n')
+        processed_lines = []
+        for line in lines:
+            line = line.strip()
+            if line:
+                processed_lines.append(line)
+
+        content = '\n'.join(processed_lines)
+        timings['extract.cleanup'] = time.perf_counter() - start
+
+        return title, content, winner
+
+
+_TOKEN_RE = re.compile(r'[\u3040-\u30ff\u4e00-\u9fff]|[^\W\u3040-\u30ff\u4e00-\u9fff]+')
+
+
+def simhash(text, shingle_size=3):
+    """64-bit SimHash over word shingles (single characters for CJK text)."""
+    tokens = _TOKEN_RE.findall(text.lower())
+    if not tokens:
+        return 0
+    count = max(1, len(tokens) - shingle_size + 1)
+    digests = b''.join(hashlib.blake2b(' '.join(tokens[i:i + shingle_size]).encode('utf-8'), digest_size=8).digest()
+                       for i in range(count))
+    value = 0
+    # 按字节统计各比特位出现次数，避免对每个 shingle 逐位循环
+    for byte_pos in range(8):
+        bit_counts = [0] * 8
+        for byte, occurrences in Counter(digests[byte_pos::8]).items():
+            for bit in range(8):
+                if byte >> bit & 1:
+                    bit_counts[bit] += occurrences
+        for bit in range(8):
+            if bit_counts[bit] * 2 > count:
+                value |= 1 << (byte_pos * 8 + bit)
+    return value
+
+
+def fingerprint(content):
+    """Return (exact hash of whitespace-normalized text, SimHash) for duplicate detection."""
+    normalized = ' '.join(content.split())
+    return hashlib.sha1(normalized.encode('utf-8')).hexdigest(), simhash(normalized)
+
+
+class NearDuplicateIndex:
+    """Exact-hash plus banded SimHash index; lookups touch only pages sharing a band with the query."""
+
+    def __init__(self, threshold=0.95):
+        self.threshold = threshold
+        # 汉明距离不超过 max_distance 的两个指纹，至少有一个分段完全相同（抽屉原理）
+        self.max_distance = int((1 - threshold) * 64)
+        bands = self.max_distance + 1
+        width = 64 // bands
+        self.bands = [(i * width, 64 - i * width if i == bands - 1 else width) for i in range(bands)]
+        self.exact = {}
+        self.buckets = {}
+
+    def find_or_add(self, url, fp):
+        """Return the canonical URL if fp duplicates an indexed page, otherwise index it and return None."""
+        exact, value = fp
+        canonical = self.exact.get(exact)
+        if canonical:
+            return canonical
+        keys = [(i, (value >> shift) & ((1 << width) - 1)) for i, (shift, width) in enumerate(self.bands)]
+        for key in keys:
+            for other_value, other_url in self.buckets.get(key, ()):
+                if bin(value ^ other_value).count('1') <= self.max_distance:
+                    return other_url
+        self.exact[exact] = url
+        for key in keys:
+            self.buckets.setdefault(key, []).append((value, url))
+        return None
+
+
+# 每个线程（进程池中即每个进程）各用一个 ContentExtractor：HTML2Text 在调用之间保留解析状态，不能跨线程共享
+_worker_state = threading.local()
+
+
+def extract_page(url, html, extractor=None, order=EXTRACTOR_ORDER):
+    """Extraction-stage entry point: parse once and return title, content, links and fingerprint.
+
+    Runs in pool workers, where each thread builds its own ContentExtractor on first use.
+    """
+    if extractor is None:
+        extractor = getattr(_worker_state, 'extractor', None)
+        if extractor is None:
+            extractor = _worker_state.extractor = ContentExtractor()
+    timings = {}
+    start = time.perf_counter()
+    page = ParsedPage(url, html)
+    timings['extract.parse'] = time.perf_counter() - start
+    title, content, winner = extractor.run_extractors(url, html, page, order, timings)
+    start = time.perf_counter()
+    links = extractor.page_links(url, page)
+    timings['extract.links'] = time.perf_counter() - start
+    start = time.perf_counter()
+    fp = fingerprint(content)
+    timings['extract.fingerprint'] = time.perf_counter() - start
+    return {
+        'title': title,
+        'content': content,
+        'extractor': winner,
+        'links': links,
+        'fingerprint': fp,
+        'timings': timings,
+    }
+
+
+def extract_archived(archive_dir, record, order=EXTRACTOR_ORDER):
+    """Re-extraction entry point: read an archived page in the worker and run extract_page on it."""
+    body = PageArchive(archive_dir).read(record['sha256'])
+    # 抓取时已确定编码的直接使用，保证与在线抓取结果一致
+    content_type = record.get('content_type')
+    if record.get('encoding'):
+        content_type = f"text/html; charset={record['encoding']}"
+    html, _, _ = decode_html(body, content_type)
+    return extract_page(record['url'], html, None, order)
+
+
+class ExtractionStrategy:
+    """Learn which extractor succeeds per host and URL template, and try it first on similar pages."""
+
+    def __init__(self, min_samples=3, revalidate_every=20):
+        self.min_samples = min_samples
+        self.revalidate_every = revalidate_every
+        self.lock = threading.Lock()
+        # 只用按默认顺序运行的结果来学习，避免首选提取器“自我强化”
+        self.wins = {}
+        self.pages = Counter()
+        self.hits = Counter()
+        self.learned = Counter()
+
+    @staticmethod
+    def template(url):
+        """Host plus path with numbers generalized and the last segment wildcarded."""
+        parsed = urlparse(url)
+        segments = [re.sub(r'\d+', '{n}', segment) for segment in parsed.path.split('/') if segment]
+        if len(segments) > 1:
+            segments[-1] = '*'
+        return f"{parsed.netloc}/{'/'.join(segments)}"
+
+    def _best(self, key):
+        wins = self.wins.get(key)
+        if not wins or sum(wins.values()) < self.min_samples:
+            return None
+        return wins.most_common(1)[0][0]
+
+    def order_for(self, url):
+        key = self.template(url)
+        host = urlparse(url).netloc
+        with self.lock:
+            self.pages[key] += 1
+            if self.pages[key] % self.revalidate_every == 0:
+                # 定期按默认顺序重新验证
+                return EXTRACTOR_ORDER
+            best = self._best(key) or self._best(host)
+        if best is None or best == EXTRACTOR_ORDER[0]:
+            return EXTRACTOR_ORDER
+        return (best,) + tuple(name for name in EXTRACTOR_ORDER if name != best)
+
+    def record(self, url, order, winner):
+        if winner is None:
+            return
+        key = self.template(url)
+        host = urlparse(url).netloc
+        with self.lock:
+            if tuple(order) == EXTRACTOR_ORDER:
+                self.wins.setdefault(key, Counter())[winner] += 1
+                self.wins.setdefault(host, Counter())[winner] += 1
+            if order[0] != EXTRACTOR_ORDER[0] or self._best(key) == EXTRACTOR_ORDER[0]:
+                self.learned[key] += 1
+                if order[0] == winner:
+                    self.hits[key] += 1
+
+    def report(self):
+        """Yield (template, preferred extractor, learned-order hits, learned-order pages)."""
+        with self.lock:
+            for key in sorted(self.learned):
+                yield key, self._best(key) or self._best(key.split('/', 1)[0]), self.hits[key], self.learned[key]
+
+
+class ResultWriter:
+    """Stream crawled pages to size-rotated shard files as they finish, with a JSONL index of every page."""
+
+    HEADER_DIGITS = 12
+
+    def __init__(self, output_format='markdown', shard_max_bytes=0, output_dir='.'):
+        if output_format not in ('markdown', 'jsonl'):
+            raise ValueError(f"Unsupported output format: {output_format}")
+        self.output_format = output_format
+        self.shard_max_bytes = shard_max_bytes or 0
+        self.output_dir = output_dir
+        self.lock = threading.Lock()
+        self.base_name = None
+        self.first_title = None
+        self.shards = []
+        self.index_file = None
+        self.shard_file = None
+        self.shard_pages = 0
+        self.shard_chars = 0
+        self.pages = 0
+        self.total_chars = 0
+        self.total_bytes = 0
+
+    @property
+    def extension(self):
+        return 'txt' if self.output_format == 'markdown' else 'jsonl'
+
+    @property
+    def index_path(self):
+        return os.path.normpath(os.path.join(self.output_dir, f"{self.base_name}-index.jsonl"))
+
+    def _header(self, pages, chars):
+        # 头部按固定宽度预留，收尾时原地改写页数和字数，不影响索引里记录的偏移量
+        header = f"# {self.first_title} (共{pages}页, 全文{chars}字)"
+        width = len(f"# {self.first_title} (共页, 全文字)") + 2 * self.HEADER_DIGITS
+        return (header.ljust(width) + '\n').encode('utf-8')
+
+    def _open_shard(self):
+        number = len(self.shards) + 1
+        suffix = '' if number == 1 else f"-part{number}"
+        path = os.path.normpath(os.path.join(self.output_dir, f"{self.base_name}{suffix}.{self.extension}"))
+        self.shard_file = open(path, 'wb')
+        self.shards.append(path)
+        self.shard_pages = 0
+        self.shard_chars = 0
+        if self.output_format == 'markdown':
+            self.shard_file.write(self._header(0, 0))
+
+    def _close_shard(self):
+        if self.shard_file is None:
+            return
+        if self.output_format == 'markdown':
+            self.shard_file.seek(0)
+            self.shard_file.write(self._header(self.shard_pages, self.shard_chars))
+            self.shard_file.seek(0, os.SEEK_END)
+        self.shard_file.close()
+        self.shard_file = None
+
+    def write(self, url, title, content, fp=None):
+        """Append one page; fp is its dedup fingerprint, kept in the index so --resume can rebuild the dedup index."""
+        char_count = len(content)
+        with self.lock:
+            if self.base_name is None:
+                timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+                self.first_title = title.strip('# ')
+                if self.first_title.startswith("未取到标题"):
+                    self.base_name = f"未取到标题-{timestamp}"
+                else:
+                    self.base_name = f"{self.first_title[:30].replace(os.sep, '_')}-{timestamp}"
+                self.index_file = open(self.index_path, 'w', encoding='utf-8')
+
+            if self.output_format == 'markdown':
+                record = f"## {title}\n(本页字数: {char_count}, URL: {url})\n{content}".encode('utf-8')
+            else:
+                record = (json.dumps({'url': url, 'title': title, 'char_count': char_count, 'content': content},
+                                     ensure_ascii=False) + '\n').encode('utf-8')
+
+            if self.shard_file is None:
+                self._open_shard()
+            elif self.shard_max_bytes and self.shard_file.tell() + len(record) > self.shard_max_bytes:
+                self._close_shard()
+                self._open_shard()
+            elif self.output_format == 'markdown':
+                # 与原来 '---\n'.join(results) 的格式保持一致
+                self.shard_file.write(b'---\n')
+
+            offset = self.shard_file.tell()
+            self.shard_file.write(record)
+            self.shard_file.flush()
+            self.shard_pages += 1
+            self.shard_chars += char_count
+            self.pages += 1
+            self.total_chars += char_count
+            self.total_bytes += len(record)
+
+            entry = {
+                'url': url, 'title': title, 'char_count': char_count,
+                'shard': os.path.basename(self.shards[-1]), 'offset': offset, 'length': len(record),
+            }
+            if fp:
+                entry['fingerprint'] = list(fp)
+            self.index_file.write(json.dumps(entry, ensure_ascii=False) + '\n')
+            self.index_file.flush()
+
+    def close(self):
+        """Finish the shards and return the first output file name."""
+        with self.lock:
+            self._close_shard()
+            if self.index_file is not None:
+                self.index_file.close()
+                self.index_file = None
+            if not self.shards:
+                timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+                filename = os.path.normpath(os.path.join(self.output_dir, f"未取到内容-{timestamp}.txt"))
+                with open(filename, 'w', encoding='utf-8') as f:
+                    f.write("# 未能提取到任何内容\n")
+                    f.write("爬虫未能从指定的URL中提取到任何有效内容。")
+                self.shards.append(filename)
+            return self.shards[0]
+
+    def snapshot(self):
+        """Return what resume() needs to continue this output, or None before the first page."""
+        if self.base_name is None:
+            return None
+        return {'base_name': self.base_name, 'first_title': self.first_title}
+
+    def resume(self, snapshot, dedup=None):
+        """Continue an interrupted run's output; returns the URLs its index already holds.
+
+        Fingerprints recorded in the index are re-added to dedup, so earlier pages still catch duplicates.
+        """
+        with self.lock:
+            self.base_name = snapshot['base_name']
+            self.first_title = snapshot['first_title']
+            shard_counts = OrderedDict()
+            urls = set()
+            for record in self.iter_index():
+                urls.add(record['url'])
+                if dedup is not None and record.get('fingerprint'):
+                    dedup.find_or_add(record['url'], tuple(record['fingerprint']))
+                counts = shard_counts.setdefault(record['shard'], [0, 0])
+                counts[0] += 1
+                counts[1] += record['char_count']
+                self.pages += 1
+                self.total_chars += record['char_count']
+                self.total_bytes += record['length']
+            self.shards = [os.path.normpath(os.path.join(self.output_dir, name)) for name in shard_counts]
+            if self.output_format == 'markdown':
+                # 被中断的分片头部可能还是占位值，按索引重写
+                for path, (pages, chars) in zip(self.shards, shard_counts.values()):
+                    if os.path.exists(path):
+                        with open(path, 'r+b') as f:
+                            f.write(self._header(pages, chars))
+            self.index_file = open(self.index_path, 'a', encoding='utf-8')
+            return urls
+
+    def iter_index(self):
+        """Yield the index records of every written page."""
+        if self.base_name is None or not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+
+class CrawlState:
+    """SQLite checkpoint of the frontier and the visited/ignored sets, committed incrementally."""
+
+    def __init__(self, path, commit_interval=2.0):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS frontier (seq INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT UNIQUE);
+            CREATE TABLE IF NOT EXISTS visited (url TEXT PRIMARY KEY, status TEXT);
+            CREATE TABLE IF NOT EXISTS ignored (url TEXT PRIMARY KEY);
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+        """)
+        self.commit_interval = commit_interval
+        self.last_commit = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reset(self):
+        with self.lock:
+            for table in ('frontier', 'visited', 'ignored', 'meta'):
+                self.conn.execute(f'DELETE FROM {table}')
+            self.conn.commit()
+
+    def load(self):
+        """Return (frontier, finished, claimed, ignored, meta) saved by an earlier run."""
+        with self.lock:
+            frontier = [row[0] for row in self.conn.execute('SELECT url FROM frontier ORDER BY seq')]
+            finished, claimed = set(), []
+            for url, status in self.conn.execute('SELECT url, status FROM visited'):
+                if status == 'claimed':
+                    claimed.append(url)
+                else:
+                    finished.add(url)
+            ignored = {row[0] for row in self.conn.execute('SELECT url FROM ignored')}
+            meta = {key: json.loads(value) for key, value in self.conn.execute('SELECT key, value FROM meta')}
+        return frontier, finished, claimed, ignored, meta
+
+    def add_frontier(self, urls):
+        with self.lock:
+            self.conn.executemany('INSERT OR IGNORE INTO frontier (url) VALUES (?)', ((url,) for url in urls))
+
+    def claim(self, url):
+        with self.lock:
+            self.conn.execute('DELETE FROM frontier WHERE url = ?', (url,))
+            self.conn.execute('INSERT OR REPLACE INTO visited (url, status) VALUES (?, ?)', (url, 'claimed'))
+
+    def finish(self, url, status):
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO visited (url, status) VALUES (?, ?)', (url, status))
+
+    def add_ignored(self, url):
+        with self.lock:
+            self.conn.execute('INSERT OR IGNORE INTO ignored (url) VALUES (?)', (url,))
+
+    def set_meta(self, key, value):
+        with self.lock:
+            self.conn.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)',
+                              (key, json.dumps(value, ensure_ascii=False)))
+
+    def commit(self, force=False):
+        # 批量提交，避免每个 URL 一次 fsync
+        now = time.monotonic()
+        if force or now - self.last_commit >= self.commit_interval:
+            with self.lock:
+                self.conn.commit()
+            self.last_commit = now
+
+    def close(self):
+        self.commit(force=True)
+        self.conn.close()
+
+
+FetchResult = namedtuple('FetchResult', ['html', 'status', 'retry_after', 'elapsed'])
+
+
+def parse_retry_after(value):
+    """Parse a Retry-After header (seconds or HTTP date) into seconds from now."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HostScheduler:
+    """Per-host politeness: a token bucket paced by crawl_delay plus AIMD concurrency limits."""
+
+    THROTTLE_STATUSES = (429, 503)
+
+    def __init__(self, crawl_delay=0, max_concurrency=10, initial_concurrency=2, latency_factor=3.0):
+        self.crawl_delay = max(0.0, float(crawl_delay or 0))
+        self.max_concurrency = max(1, max_concurrency)
+        self.initial_concurrency = max(1, min(initial_concurrency, self.max_concurrency))
+        self.latency_factor = latency_factor
+        self.hosts = {}
+        self.lock = threading.Lock()
+
+    def _host(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = {
+                'limit': float(self.initial_concurrency), 'in_flight': 0, 'tokens': 1.0,
+                'refilled': time.monotonic(), 'blocked_until': 0.0, 'delay_factor': 1.0,
+                'latency': None, 'min_latency': None, 'requests': 0, 'throttled': 0, 'errors': 0,
+            }
+        return state
+
+    def _interval(self, state):
+        return self.crawl_delay * state['delay_factor']
+
+    def _refill(self, state, now):
+        interval = self._interval(state)
+        if interval <= 0:
+            state['tokens'] = 1.0
+        else:
+            state['tokens'] = min(1.0, state['tokens'] + (now - state['refilled']) / interval)
+        state['refilled'] = now
+
+    def wait_time(self, host, now=None):
+        """Seconds until a request to host may start; None if it must wait for a request to finish."""
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            state = self._host(host)
+            if state['in_flight'] >= int(state['limit']):
+                return None
+            self._refill(state, now)
+            wait = max(0.0, state['blocked_until'] - now)
+            if state['tokens'] < 1.0:
+                wait = max(wait, (1.0 - state['tokens']) * self._interval(state))
+            return wait
+
+    def acquire(self, host):
+        with self.lock:
+            state = self._host(host)
+            state['tokens'] -= 1.0
+            state['in_flight'] += 1
+            state['requests'] += 1
+
+    def release(self, host, elapsed, status, retry_after=None):
+        """Record a finished request and adapt the host's concurrency and pacing."""
+        now = time.monotonic()
+        with self.lock:
+            state = self._host(host)
+            state['in_flight'] -= 1
+            if status is None or status in self.THROTTLE_STATUSES or status >= 500:
+                # 被限流或出错：并发减半；限流时请求间隔加倍，并遵守 Retry-After
+                state['limit'] = max(1.0, state['limit'] / 2)
+                if status in self.THROTTLE_STATUSES:
+                    state['throttled'] += 1
+                    state['delay_factor'] = min(state['delay_factor'] * 2, 16.0)
+                    if not self.crawl_delay:
+                        # 未配置间隔时也要在限流后暂停一会
+                        state['blocked_until'] = max(state['blocked_until'], now + 1.0)
+                else:
+                    state['errors'] += 1
+                if retry_after is not None:
+                    state['blocked_until'] = max(state['blocked_until'], now + retry_after)
+                return
+
+            state['latency'] = elapsed if state['latency'] is None else 0.8 * state['latency'] + 0.2 * elapsed
+            if state['min_latency'] is None or elapsed < state['min_latency']:
+                state['min_latency'] = elapsed
+            state['delay_factor'] = max(1.0, state['delay_factor'] * 0.8)
+            if state['latency'] <= self.latency_factor * max(state['min_latency'], 0.05):
+                # 延迟健康：每轮大约增加一个并发
+                state['limit'] = min(float(self.max_concurrency), state['limit'] + 1.0 / state['limit'])
+            else:
+                state['limit'] = max(1.0, state['limit'] * 0.9)
+
+    def stats(self):
+        with self.lock:
+            return {host: {'concurrency': int(state['limit']), 'requests': state['requests'],
+                           'throttled': state['throttled'], 'errors': state['errors'],
+                           'latency': round(state['latency'] or 0.0, 3)}
+                    for host, state in self.hosts.items()}
+
+
+class Histogram:
+    """Log-bucketed histogram (about 9% resolution) with constant memory for percentile estimates."""
+
+    BUCKETS_PER_OCTAVE = 8
+
+    def __init__(self):
+        self.buckets = Counter()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+        bucket = math.floor(math.log2(value) * self.BUCKETS_PER_OCTAVE) if value > 0 else None
+        self.buckets[bucket] += 1
+
+    def percentile(self, fraction):
+        if not self.count:
+            return 0.0
+        rank = fraction * self.count
+        seen = 0
+        for bucket in sorted(self.buckets, key=lambda b: float('-inf') if b is None else b):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                # 取桶上界，保证估计值不低于真实值
+                return 0.0 if bucket is None else min(self.max, 2 ** ((bucket + 1) / self.BUCKETS_PER_OCTAVE))
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'total': round(self.total, 6),
+            'mean': round(self.total / self.count, 6) if self.count else 0.0,
+            'p50': round(self.percentile(0.50), 6),
+            'p95': round(self.percentile(0.95), 6),
+            'p99': round(self.percentile(0.99), 6),
+            'max': round(self.max, 6),
+        }
+
+
+class CrawlMetrics:
+    """Per-stage timers, byte and page counters, queue depths and a throughput timeline."""
+
+    def __init__(self, sample_interval=5.0):
+        self.sample_interval = sample_interval
+        self.started = time.monotonic()
+        self.lock = threading.Lock()
+        self.stages = {}
+        self.counters = Counter()
+        self.queues = {}
+        self.timeline = []
+        self.last_sample = self.started
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram()
+            histogram.observe(seconds)
+
+    def observe_all(self, timings):
+        for stage, seconds in timings.items():
+            self.observe(stage, seconds)
+
+    def count(self, name, amount=1):
+        with self.lock:
+            self.counters[name] += amount
+
+    def sample(self, pages, **depths):
+        """Record queue depths and throughput at most once per sample_interval; returns the sample or None."""
+        now = time.monotonic()
+        if now - self.last_sample < self.sample_interval:
+            return None
+        with self.lock:
+            for name, depth in depths.items():
+                self.queues.setdefault(name, Histogram()).observe(depth)
+            previous = self.timeline[-1] if self.timeline else {'elapsed': 0.0, 'pages': 0}
+            elapsed = now - self.started
+            point = {
+                'elapsed': round(elapsed, 3),
+                'pages': pages,
+                'pages_per_sec': round((pages - previous['pages']) / max(elapsed - previous['elapsed'], 1e-9), 3),
+                'bytes_downloaded': self.counters['bytes_downloaded'],
+            }
+            point.update(depths)
+            self.timeline.append(point)
+            self.last_sample = now
+        return point
+
+    def report(self, pages):
+        elapsed = time.monotonic() - self.started
+        with self.lock:
+            return {
+                'elapsed': round(elapsed, 3),
+                'pages': pages,
+                'pages_per_sec': round(pages / elapsed, 3) if elapsed else 0.0,
+                'counters': dict(self.counters),
+                'stages': {name: histogram.summary() for name, histogram in sorted(self.stages.items())},
+                'queues': {name: histogram.summary() for name, histogram in sorted(self.queues.items())},
+                'timeline': list(self.timeline),
+            }
+
+
 class WebCrawler:
-    def __init__(self, initial_urls, url_patterns=None, ignore_patterns=None, max_urls=100):
+    def __init__(self, initial_urls, url_patterns=None, ignore_patterns=None, max_urls=100, max_workers=10,
+                 http_cache_dir=None, extract_workers=None, extract_queue_size=None,
+                 output_format='markdown', shard_max_bytes=0, output_dir='.', state_db=None,
+                 max_runtime=0, stop_file=None, crawl_delay=0, max_retries=3, retry_backoff=1.0,
+                 duplicate_threshold=0.95, duplicate_action='drop', learn_extractors=True,
+                 progress_interval=0, archive_dir=None, use_sitemaps=False, sitemap_urls=None,
+                 max_sitemaps=50):
         self.initial_urls = initial_urls
         self.url_patterns = url_patterns or []
         self.ignore_patterns = ignore_patterns or []
         self.max_urls = max_urls
+        # 无人值守的停止规则：运行时长上限（秒，0 为不限）和停止标记文件
+        self.max_runtime = max_runtime or 0
+        self.stop_file = stop_file
+        self.max_workers = max(1, int(max_workers))
+        # 按主机限速和自适应并发，max_workers 是全局及单主机的并发上限
+        self.scheduler = HostScheduler(crawl_delay, self.max_workers)
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.attempts = {}
+        self.retry_queue = []
+        # 解析进程数，0 表示在抓取线程池内直接解析（不启用进程池）
+        if extract_workers is None:
+            extract_workers = os.cpu_count() or 1
+        self.extract_workers = max(0, int(extract_workers))
+        # 等待解析的页面上限，超过后暂停抓取（背压）
+        self.extract_queue_size = extract_queue_size or 2 * max(1, self.extract_workers)
         self.visited_urls = set()
-        self.to_crawl = set()
-        self.results = []
-        self.total_chars = 0
+        self.to_crawl = deque()
+        # 页面内容直接流式写入磁盘，内存中只保留计数
+        self.writer = ResultWriter(output_format, shard_max_bytes, output_dir)
+        # 内容指纹去重：相似度超过阈值的页面丢弃或只记录指向原页面的链接
+        self.dedup = NearDuplicateIndex(duplicate_threshold) if duplicate_threshold else None
+        if duplicate_action not in ('drop', 'link'):
+            raise ValueError(f"Unsupported duplicate action: {duplicate_action}")
+        self.duplicate_action = duplicate_action
+        self.duplicates = []
+        # 断点续爬：frontier 和已访问状态增量写入 SQLite
+        self.state = CrawlState(state_db) if state_db else None
         self.ignored_urls = set()
         self.normalized_urls = set()
+        self.url_matcher = UrlMatcher(self.url_patterns, self.ignore_patterns)
+        # 工作线程共享 visited/normalized/ignored，统一由这把锁保护
+        self.lock = threading.Lock()
+        # 每个主机一个 Session，复用 keep-alive 连接
+        self.sessions = {}
+        self.http_cache = HttpCache(http_cache_dir) if http_cache_dir else None
+        self.cache_hits = 0
+        # 原始页面归档，用于不联网重新提取
+        self.archive = PageArchive(archive_dir) if archive_dir else None
+        # 从 robots.txt 和 sitemap 批量补充 frontier；lastmod 早于缓存时间的页面直接用缓存
+        self.use_sitemaps = use_sitemaps or bool(sitemap_urls)
+        self.sitemap_urls = sitemap_urls or []
+        self.max_sitemaps = max_sitemaps
+        self.sitemap_lastmod = {}
+        self.robots_parsers = {}
 
         logging.basicConfig(level=logging.DEBUG)
         self.logger = logging.getLogger(__name__)
 
-        self.text_maker = html2text.HTML2Text()
-        self.text_maker.bypass_tables = False
-        self.text_maker.mark_code = True
-        self.text_maker.code = True
-        self.text_maker.body_width = 0  # 防止自动换行
-
-        self.gne_extractor = gne.GeneralNewsExtractor()
+        self.extractor = ContentExtractor()
+        # 分阶段计时；progress_interval > 0 时按该间隔（秒）输出一行进度
+        self.progress_interval = progress_interval or 0
+        self.metrics = CrawlMetrics(self.progress_interval or 5.0)
+        # 按站点/URL 模板记录哪个提取器成功，后续同类页面优先尝试它
+        self.strategy = ExtractionStrategy() if learn_extractors else None
 
     def normalize_url(self, url):
-        """Remove hash fragment from URL and normalize it."""
-        parsed = urlparse(url)
-        return urlunparse(parsed._replace(fragment=''))
+        return normalize_url(url)
 
     def is_valid_url(self, url):
         normalized_url = self.normalize_url(url)
-        if normalized_url in self.normalized_urls:
-            self.logger.debug(f"Duplicate URL (after normalization): {url}")
-            return False
-        if any(re.match(pattern, normalized_url) for pattern in self.ignore_patterns):
-            self.ignored_urls.add(normalized_url)
+        with self.lock:
+            if normalized_url in self.normalized_urls:
+                self.logger.debug(f"Duplicate URL (after normalization): {url}")
+                return False
+        decision = self.url_matcher.decide(normalized_url)
+        if decision == UrlMatcher.IGNORE:
+            with self.lock:
+                self.ignored_urls.add(normalized_url)
+            if self.state:
+                self.state.add_ignored(normalized_url)
             self.logger.debug(f"Ignored URL: {normalized_url}")
             return False
-        is_valid = any(re.match(pattern, normalized_url) for pattern in self.url_patterns)
+        is_valid = decision == UrlMatcher.VALID
         if is_valid:
-            self.normalized_urls.add(normalized_url)
+            with self.lock:
+                # 另一个线程可能已抢先登记同一 URL，只有首次登记者算有效
+                if normalized_url in self.normalized_urls:
+                    return False
+                self.normalized_urls.add(normalized_url)
         self.logger.debug(f"URL validity check: {normalized_url} - {'Valid' if is_valid else 'Invalid'}")
         return is_valid
 
-    def extract_links(self, url, html):
-        soup = BeautifulSoup(html, 'html.parser')
-        links = set()
-        # 特别关注左侧菜单
-        left_menu = soup.find('nav', class_='table-of-contents')
-        if left_menu:
-            for a_tag in left_menu.find_all('a', href=True):
-                link = urljoin(url, a_tag['href'])
-                normalized_link = self.normalize_url(link)
-                if self.is_valid_url(normalized_link) and normalized_link not in self.visited_urls:
-                    links.add(normalized_link)
-        # 同时也提取页面中的其他链接
-        for a_tag in soup.find_all('a', href=True):
-            link = urljoin(url, a_tag['href'])
-            normalized_link = self.normalize_url(link)
-            if self.is_valid_url(normalized_link) and normalized_link not in self.visited_urls:
-                links.add(normalized_link)
-        self.logger.info(f"Extracted {len(links)} valid links from {url}")
-        return links
+    def filter_links(self, url, links):
+        """Keep the links that pass is_valid_url and have not been visited."""
+        start = time.perf_counter()
+        valid_links = [link for link in links if self.is_valid_url(link) and link not in self.visited_urls]
+        self.metrics.observe('links.filter', time.perf_counter() - start)
+        self.logger.info(f"Extracted {len(valid_links)} valid links from {url}")
+        return valid_links
 
-    def fetch_url(self, url):
+    def extract_links(self, url, html, page=None):
+        page = page or ParsedPage(url, html)
+        return self.filter_links(url, self.extractor.page_links(url, page))
+
+    def extract_content(self, url, html, page=None):
+        return self.extractor.extract_content(url, html, page)
+
+    def get_session(self, url):
+        """Return the pooled keep-alive session for the URL's host."""
+        host = urlparse(url).netloc
+        with self.lock:
+            session = self.sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+                session.mount('http://', adapter)
+                session.mount('https://', adapter)
+                session.headers['Accept-Encoding'] = 'gzip, deflate'
+                self.sessions[host] = session
+        return session
+
+    def fetch(self, url):
+        """Fetch a URL and return a FetchResult with the status the scheduler needs."""
+        start = time.monotonic()
         try:
             headers = {'User-Agent': kuser_agent.get()}
-            response = requests.get(url, headers=headers, timeout=10)
-            response.encoding = response.apparent_encoding
+            cached = self.http_cache.get(url) if self.http_cache else None
+            if cached:
+                headers.update(self.http_cache.conditional_headers(cached))
+            response = self.get_session(url).get(url, headers=headers, timeout=10)
+            elapsed = time.monotonic() - start
+            # response.elapsed 是收到响应头的耗时（DNS/连接/首字节），其余为下载正文
+            headers_time = response.elapsed.total_seconds()
+            self.metrics.observe('fetch.headers', headers_time)
+            self.metrics.observe('fetch.body', max(0.0, elapsed - headers_time))
+            self.metrics.count('bytes_downloaded', len(response.content))
+            self.metrics.count(f'status.{response.status_code}')
+            if response.status_code == 304 and cached:
+                # 内容未变化，直接复用缓存正文
+                with self.lock:
+                    self.cache_hits += 1
+                self.logger.debug(f"Not modified, using cached body: {url}")
+                body = self.http_cache.read_body(url)
+                html = body.decode(cached.get('encoding') or 'utf-8', errors='replace')
+                if self.archive:
+                    self.archive.store(url, body, 304, response.headers.get('Content-Type'), cached.get('encoding'))
+                return FetchResult(html, 304, None, elapsed)
             if response.status_code == 200:
-                return response.text
-            else:
-                self.logger.warning(f"Failed to fetch {url}: Status code {response.status_code}")
+                decode_start = time.perf_counter()
+                html, response.encoding, method = decode_html(response.content, response.headers.get('Content-Type'))
+                self.metrics.observe('fetch.decode', time.perf_counter() - decode_start)
+                self.metrics.count(f'decode.{method}')
+                self.logger.debug(f"Decoded {url} as {response.encoding} via {method}")
+                if self.http_cache:
+                    self.http_cache.store(url, response)
+                if self.archive:
+                    self.archive.store(url, response.content, 200, response.headers.get('Content-Type'),
+                                       response.encoding)
+                return FetchResult(html, 200, None, elapsed)
+            self.logger.warning(f"Failed to fetch {url}: Status code {response.status_code}")
+            return FetchResult(None, response.status_code,
+                               parse_retry_after(response.headers.get('Retry-After')), elapsed)
         except requests.RequestException as e:
+            self.metrics.count('fetch_errors')
             self.logger.error(f"Error fetching {url}: {str(e)}")
-        return None
+        return FetchResult(None, None, None, time.monotonic() - start)
 
-    def extract_content(self, url, html):
-        # 首先使用 newspaper3k 提取内容
-        article = Article(url)
-        article.set_html(html)
-        article.parse()
+    def fetch_url(self, url):
+        html = self.unchanged_body(url)
+        return html if html is not None else self.fetch(url).html
 
-        title = article.title if article.title else "未取到标题"
-        content = article.text
+    def unchanged_body(self, url):
+        """Return the cached page if its sitemap lastmod is not newer than the cached copy, else None."""
+        lastmod = self.sitemap_lastmod.get(url)
+        if lastmod is None or not self.http_cache:
+            return None
+        cached = self.http_cache.get(url)
+        if not cached or cached.get('fetched_at', 0) < lastmod:
+            return None
+        body = self.http_cache.read_body(url)
+        self.metrics.count('sitemap.unchanged')
+        if self.archive:
+            self.archive.store(url, body, 304, None, cached.get('encoding'))
+        self.logger.debug(f"Unchanged since sitemap lastmod, using cached body: {url}")
+        return body.decode(cached.get('encoding') or 'utf-8', errors='replace')
 
-        # 如果 newspaper3k 没有提取到内容，使用 GNE 作为备选
-        if not content.strip():
-            gne_result = self.gne_extractor.extract(html)
-            if gne_result['title'] and gne_result['content']:
-                title = gne_result['title'] if not title else title
-                content = gne_result['content']
+    def robots_parser(self, url):
+        """Return the parsed robots.txt of the URL's host, fetched once per host; None if there is none."""
+        parts = urlparse(url)
+        host = f"{parts.scheme}://{parts.netloc}"
+        if host not in self.robots_parsers:
+            robots_url = f"{host}/robots.txt"
+            parser = None
+            try:
+                response = self.get_session(robots_url).get(robots_url, headers={'User-Agent': kuser_agent.get()},
+                                                            timeout=10)
+                if response.status_code == 200:
+                    parser = RobotFileParser(robots_url)
+                    parser.parse(response.text.splitlines())
+            except requests.RequestException as e:
+                self.logger.warning(f"Error fetching {robots_url}: {str(e)}")
+            self.robots_parsers[host] = parser
+        return self.robots_parsers[host]
 
-        # 如果 GNE 也没有提取到内容，使用 BeautifulSoup 和 html2text 作为最后的备选
-        if not content.strip():
-            soup = BeautifulSoup(html, 'html.parser')
-            main_content = soup.find('article') or soup.find('main') or soup.find('div', class_='content')
+    def robots_sitemaps(self, url):
+        """Return the Sitemap entries listed in the host's robots.txt."""
+        parser = self.robots_parser(url)
+        return (parser.site_maps() or []) if parser else []
 
-            if main_content:
-                content = self.text_maker.handle(str(main_content))
-            else:
-                # 如果仍然找不到内容，使用整个 body
-                body = soup.find('body')
-                if body:
-                    content = self.text_maker.handle(str(body))
+    def robots_allowed(self, url):
+        # User-Agent 每次随机选取，按 '*' 分组的规则判断
+        parser = self.robots_parser(url)
+        return parser is None or parser.can_fetch('*', url)
 
-        # 如果所有方法都失败，添加提示信息
-        if not content.strip():
-            content = "未能提取到网页正文"
+    def read_sitemap(self, sitemap_url):
+        """Stream the entries of a (possibly gzipped) sitemap without loading it into memory."""
+        response = self.get_session(sitemap_url).get(sitemap_url, headers={'User-Agent': kuser_agent.get()},
+                                                     timeout=10, stream=True)
+        with response:
+            if response.status_code != 200:
+                self.logger.warning(f"Failed to fetch sitemap {sitemap_url}: Status code {response.status_code}")
+                return
+            # 解开传输层压缩；.xml.gz 文件本身的 gzip 按魔数识别
+            response.raw.decode_content = True
+            # 读完后由 with 关闭；否则 urllib3 会提前关闭，BufferedReader 再读时报错
+            response.raw.auto_close = False
+            stream = io.BufferedReader(response.raw)
+            if stream.peek(2)[:2] == b'\x1f\x8b':
+                stream = gzip.GzipFile(fileobj=stream)
+            yield from iter_sitemap(stream)
 
-        # 移除非内容的HTML代码
-        content = re.sub(r'<ph[^>]*>.*?</ph>', '', content)
+    def seed_from_sitemaps(self):
+        """Add the URLs listed in sitemaps to the frontier, most recently modified first."""
+        pending = deque(self.sitemap_urls)
+        if not pending:
+            for url in self.initial_urls:
+                parts = urlparse(url)
+                pending.extend(self.robots_sitemaps(url) or [f"{parts.scheme}://{parts.netloc}/sitemap.xml"])
+        seen = set()
+        entries = {}
+        while pending and len(seen) < self.max_sitemaps:
+            sitemap_url = pending.popleft()
+            if sitemap_url in seen:
+                continue
+            seen.add(sitemap_url)
+            start = time.perf_counter()
+            try:
+                for kind, loc, lastmod in self.read_sitemap(sitemap_url):
+                    if kind == 'sitemap':
+                        pending.append(urljoin(sitemap_url, loc))
+                        continue
+                    url = self.normalize_url(urljoin(sitemap_url, loc))
+                    if url not in entries or (lastmod or 0) > (entries[url] or 0):
+                        entries[url] = lastmod
+            except (requests.RequestException, lxml.etree.XMLSyntaxError, OSError, EOFError) as e:
+                self.logger.warning(f"Error reading sitemap {sitemap_url}: {str(e)}")
+            self.metrics.observe('sitemap', time.perf_counter() - start)
 
-        # 处理内容，保留段落结构但移除多余的空行
-        lines = content.split('\n')
-        processed_lines = []
-        for line in lines:
-            line = line.strip()
-            if line:
-                processed_lines.append(line)
+        # sitemap 中列出的页面也可能被 robots.txt 禁止，这些不加入队列
+        seeds = [url for url in entries if self.is_valid_url(url) and self.robots_allowed(url)]
+        # 最近修改的页面优先；没有 lastmod 的排在最后
+        seeds.sort(key=lambda url: -(entries[url] or 0))
+        self.sitemap_lastmod.update((url, entries[url]) for url in seeds if entries[url])
+        self.to_crawl.extend(seeds)
+        if self.state:
+            self.state.add_frontier(seeds)
+        self.metrics.count('sitemap.files', len(seen))
+        self.metrics.count('sitemap.seeded', len(seeds))
+        self.logger.info(f"Seeded {len(seeds)} of {len(entries)} sitemap URLs from {len(seen)} sitemaps")
+        return seeds
 
-        content = '\n'.join(processed_lines)
+    def is_transient(self, result):
+        return result.status is None or result.status in HostScheduler.THROTTLE_STATUSES or result.status >= 500
 
-        return title, content
+    def schedule_retry(self, url, result):
+        """Queue a transient failure for another attempt with jittered backoff; False if out of retries."""
+        attempt = self.attempts.get(url, 0) + 1
+        if attempt > self.max_retries:
+            return False
+        self.attempts[url] = attempt
+        backoff = self.retry_backoff * (2 ** (attempt - 1)) * random.uniform(0.5, 1.5)
+        delay = max(backoff, result.retry_after or 0)
+        heapq.heappush(self.retry_queue, (time.monotonic() + delay, url))
+        self.logger.info(f"Retrying {url} in {delay:.1f}s (attempt {attempt}/{self.max_retries})")
+        return True
+
+    def close(self):
+        for session in self.sessions.values():
+            session.close()
+        self.sessions.clear()
+        if self.state:
+            self.checkpoint(force=True)
+            self.state.close()
+            self.state = None
+
+    def claim_url(self, url):
+        """Mark a frontier URL as visited; returns False if it should be skipped."""
+        with self.lock:
+            if url in self.ignored_urls:
+                self.logger.info(f"Skipping ignored URL: {url}")
+                return False
+            self.visited_urls.add(url)
+        if self.state:
+            self.state.claim(url)
+        return True
+
+    def finish_url(self, url, status):
+        if self.state:
+            self.state.finish(url, status)
+
+    def checkpoint(self, force=False):
+        if self.state:
+            snapshot = self.writer.snapshot()
+            if snapshot:
+                self.state.set_meta('writer', snapshot)
+            self.state.commit(force)
+
+    def restore_state(self):
+        """Reload frontier and visited sets from the checkpoint; completed pages are not refetched."""
+        frontier, finished, claimed, ignored, meta = self.state.load()
+        if meta.get('writer'):
+            finished |= self.writer.resume(meta['writer'], self.dedup)
+        # 上次中断时正在处理、但尚未写出的页面重新排队
+        requeue = [url for url in claimed if url not in finished]
+        self.visited_urls = set(finished)
+        self.ignored_urls = ignored
+        self.to_crawl = deque(requeue + [url for url in frontier if url not in finished])
+        self.normalized_urls = set(self.to_crawl) | self.visited_urls
+        self.logger.info(f"Resumed crawl: {len(self.visited_urls)} pages done, {len(self.to_crawl)} URLs queued")
+
+    def should_stop(self, started):
+        """Return a reason to stop scheduling new URLs, or None."""
+        if len(self.visited_urls) >= self.max_urls:
+            return f"reached max_urls={self.max_urls}"
+        if self.max_runtime and time.monotonic() - started >= self.max_runtime:
+            return f"reached max_runtime={self.max_runtime}s"
+        if self.stop_file and os.path.exists(self.stop_file):
+            return f"found stop file {self.stop_file}"
+        return None
+
+    @property
+    def pages_crawled(self):
+        return self.writer.pages
+
+    @property
+    def total_chars(self):
+        return self.writer.total_chars
+
+    def record_page(self, url, title, content, fp=None):
+        start = time.perf_counter()
+        self.writer.write(url, title, content, fp)
+        self.metrics.observe('write', time.perf_counter() - start)
+        self.finish_url(url, 'done')
+        if self.writer.pages == 1:
+            # 输出文件名确定后立即记录，保证中断后能续写同一组文件
+            self.checkpoint(force=True)
+        self.logger.info(f"Crawled: {url} - Title: {title} - Char count: {len(content)}")
 
     def crawl_url(self, url):
+        """Fetch, extract and record a single URL synchronously; returns its new links."""
         normalized_url = self.normalize_url(url)
-        if normalized_url in self.ignored_urls:
-            self.logger.info(f"Skipping ignored URL: {normalized_url}")
-            return set()
+        if not self.claim_url(normalized_url):
+            return []
 
-        self.visited_urls.add(normalized_url)
         html = self.fetch_url(normalized_url)
         if html:
-            title, content = self.extract_content(normalized_url, html)
-            char_count = len(content)
-            self.total_chars += char_count
-            md_content = f"## {title}\n(本页字数: {char_count}, URL: {normalized_url})\n{content}"
-            self.results.append(md_content)
-            self.logger.info(f"Crawled: {normalized_url} - Title: {title} - Char count: {char_count}")
-            return self.extract_links(normalized_url, html)
+            order = self.strategy.order_for(normalized_url) if self.strategy else EXTRACTOR_ORDER
+            result = extract_page(normalized_url, html, self.extractor, order)
+            return self.handle_extracted(normalized_url, result, order)
         else:
+            self.finish_url(normalized_url, 'failed')
             self.logger.warning(f"Failed to crawl: {normalized_url}")
-        return set()
-
-    def crawl(self):
-        self.to_crawl = set(self.initial_urls)
-        while self.to_crawl:
-            if len(self.visited_urls) >= self.max_urls:
-                user_input = input(f"Reached {self.max_urls} URLs. Continue? (y/n): ")
-                if user_input.lower() != 'y':
-                    break
-                self.max_urls += 100
-
-            with concurrent.futures.ThreadPoolExecutor(max_workers=10) as executor:
-                future_to_url = {executor.submit(self.crawl_url, url): url for url in list(self.to_crawl)[:10]}
-                for future in concurrent.futures.as_completed(future_to_url):
-                    url = future_to_url[future]
-                    self.to_crawl.remove(url)
+        return []
+
+    def handle_extracted(self, url, result, order=EXTRACTOR_ORDER):
+        """Dedupe and record an extracted page; returns its new links."""
+        self.metrics.observe_all(result['timings'])
+        if self.strategy:
+            self.strategy.record(url, order, result['extractor'])
+        with self.lock:
+            canonical = self.dedup.find_or_add(url, result['fingerprint']) if self.dedup else None
+            if canonical:
+                self.duplicates.append((url, canonical))
+        if canonical is None:
+            self.record_page(url, result['title'], result['content'], result['fingerprint'])
+        elif self.duplicate_action == 'link':
+            self.logger.info(f"Near-duplicate of {canonical}: {url}")
+            self.record_page(url, result['title'], f"重复页面，内容同 {canonical}")
+        else:
+            self.logger.info(f"Dropped near-duplicate of {canonical}: {url}")
+            self.finish_url(url, 'duplicate')
+        return self.filter_links(url, result['links'])
+
+    def next_ready_url(self, now, allow_new):
+        """Pop the next URL whose host may be contacted now; returns (url, is_retry, wait)."""
+        wait = None
+        if self.retry_queue and self.retry_queue[0][0] <= now:
+            url = self.retry_queue[0][1]
+            host_wait = self.scheduler.wait_time(urlparse(url).netloc, now)
+            if host_wait == 0:
+                heapq.heappop(self.retry_queue)
+                return url, True, None
+            wait = host_wait
+        elif self.retry_queue:
+            wait = self.retry_queue[0][0] - now
+
+        if not allow_new:
+            return None, False, wait
+        # 跳过当前不能访问的主机，但只向前查看有限个 URL，避免 frontier 很大时反复全量扫描
+        deferred = []
+        found = None
+        for _ in range(min(len(self.to_crawl), 64)):
+            url = self.to_crawl.popleft()
+            host_wait = self.scheduler.wait_time(urlparse(url).netloc, now)
+            if host_wait == 0:
+                found = url
+                break
+            deferred.append(url)
+            if host_wait is not None:
+                wait = host_wait if wait is None else min(wait, host_wait)
+        self.to_crawl.extendleft(reversed(deferred))
+        return found, False, wait
+
+    def sample_progress(self, fetching, extracting):
+        point = self.metrics.sample(self.pages_crawled, frontier=len(self.to_crawl), fetching=fetching,
+                                    extracting=extracting, retrying=len(self.retry_queue))
+        if point and self.progress_interval:
+            self.logger.info(f"进度: 已抓取{point['pages']}页, {point['pages_per_sec']}页/秒, "
+                             f"已下载{point['bytes_downloaded']}字节, 待抓取{point['frontier']}, "
+                             f"抓取中{fetching}, 解析中{extracting}, 等待重试{point['retrying']}")
+
+    def submit_extraction(self, pool, extracting, url, html):
+        order = self.strategy.order_for(url) if self.strategy else EXTRACTOR_ORDER
+        future = pool.submit(extract_page, url, html, None, order)
+        extracting[future] = (url, order, time.monotonic())
+
+    def crawl(self, resume=False):
+        """Two-stage crawl: fetch threads feed raw HTML to a bounded process-pool extraction stage."""
+        if resume and self.state:
+            self.restore_state()
+        else:
+            if self.state:
+                self.state.reset()
+            self.to_crawl = deque(self.normalize_url(url) for url in self.initial_urls)
+            with self.lock:
+                self.normalized_urls.update(self.to_crawl)
+            if self.state:
+                self.state.add_frontier(self.to_crawl)
+            if self.use_sitemaps:
+                self.seed_from_sitemaps()
+
+        fetch_pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.max_workers)
+        if self.extract_workers:
+            extract_pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.extract_workers)
+        else:
+            extract_pool = fetch_pool
+        fetching = {}
+        extracting = {}
+        started = time.monotonic()
+        stop_reason = None
+        try:
+            while (self.to_crawl and not stop_reason) or self.retry_queue or fetching or extracting:
+                # 只要有空闲 worker、解析队列未满且主机允许就立即补充抓取任务
+                wait = None
+                while len(fetching) < self.max_workers and len(extracting) < self.extract_queue_size:
+                    stop_reason = self.should_stop(started)
+                    url, is_retry, wait = self.next_ready_url(time.monotonic(), allow_new=not stop_reason)
+                    if url is None:
+                        break
+                    if is_retry or self.claim_url(url):
+                        html = self.unchanged_body(url)
+                        if html is not None:
+                            # 不发请求，也不占用主机的并发和限速配额
+                            self.submit_extraction(extract_pool, extracting, url, html)
+                            continue
+                        self.scheduler.acquire(urlparse(url).netloc)
+                        fetching[fetch_pool.submit(self.fetch, url)] = url
+
+                if not fetching and not extracting:
+                    # 所有主机都在限速或等待重试，睡到最早可以发请求的时刻
+                    time.sleep(wait if wait is not None else 0.05)
+                    continue
+
+                done, _ = concurrent.futures.wait(list(fetching) + list(extracting), timeout=wait,
+                                                  return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    if future in fetching:
+                        url = fetching.pop(future)
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            self.logger.error(f"Error fetching {url}: {str(e)}")
+                            result = FetchResult(None, None, None, 0.0)
+                        self.scheduler.release(urlparse(url).netloc, result.elapsed, result.status,
+                                               result.retry_after)
+                        if result.html:
+                            self.submit_extraction(extract_pool, extracting, url, result.html)
+                        elif not (self.is_transient(result) and self.schedule_retry(url, result)):
+                            self.finish_url(url, 'failed')
+                            self.logger.warning(f"Failed to crawl: {url}")
+                        continue
+
+                    url, order, submitted = extracting.pop(future)
+                    # 包含排队等待解析进程的时间
+                    self.metrics.observe('extract.roundtrip', time.monotonic() - submitted)
                     try:
-                        new_links = future.result()
-                        self.to_crawl.update(new_links - self.visited_urls)
+                        new_links = self.handle_extracted(url, future.result(), order)
                     except Exception as e:
+                        self.finish_url(url, 'failed')
                         self.logger.error(f"Error processing {url}: {str(e)}")
+                        continue
+                    self.to_crawl.extend(new_links)
+                    if self.state:
+                        self.state.add_frontier(new_links)
+                self.checkpoint()
+                self.sample_progress(len(fetching), len(extracting))
+        finally:
+            fetch_pool.shutdown()
+            if extract_pool is not fetch_pool:
+                extract_pool.shutdown()
+            self.checkpoint(force=True)
 
-    def save_results(self):
-        timestamp = datetime.now().strftime("%Y%m%d-%H%M%S")
-        if self.results:
-            first_title = self.results[0].split('\n')[0].strip('# ')
-            if first_title.startswith("未取到标题"):
-                filename = f"未取到标题-{timestamp}.txt"
-            else:
-                filename = f"{first_title[:30]}-{timestamp}.txt"
-        else:
-            filename = f"未取到内容-{timestamp}.txt"
+        if stop_reason:
+            self.logger.info(f"Stopped scheduling new URLs ({stop_reason}); "
+                             f"{len(self.to_crawl)} URLs left in the frontier")
 
-        with open(filename, 'w', encoding='utf-8') as f:
-            if self.results:
-                f.write(f"# {first_title} (共{len(self.results)}页, 全文{self.total_chars}字)\n")
-                f.write('---\n'.join(self.results))
-            else:
-                f.write("# 未能提取到任何内容\n")
-                f.write("爬虫未能从指定的URL中提取到任何有效内容。")
+    def re_extract(self):
+        """Rebuild the output from the page archive with the current extractors; makes no requests."""
+        if not self.archive:
+            raise ValueError("re-extract requires archive_dir")
+        # 归档目录可能由多次抓取、多个站点共用：只取当前配置会抓取的页面（种子 URL 或匹配 url_patterns 且未被忽略）
+        seeds = {self.normalize_url(url) for url in self.initial_urls}
+        records = [record for record in self.archive.entries()
+                   if record['url'] in seeds or self.url_matcher.decide(record['url']) == UrlMatcher.VALID]
+        if len(records) > self.max_urls:
+            self.logger.warning(f"{len(records)} archived pages match the config; "
+                                f"re-extracting only the first {self.max_urls} (max_urls)")
+            records = records[:self.max_urls]
+        self.logger.info(f"Re-extracting {len(records)} archived pages from {self.archive.archive_dir}")
+        pool = concurrent.futures.ProcessPoolExecutor(max_workers=self.extract_workers or 1)
+        pending = deque(records)
+        extracting = {}
+        try:
+            while pending or extracting:
+                while pending and len(extracting) < self.extract_queue_size:
+                    record = pending.popleft()
+                    order = self.strategy.order_for(record['url']) if self.strategy else EXTRACTOR_ORDER
+                    future = pool.submit(extract_archived, self.archive.archive_dir, record, order)
+                    extracting[future] = (record['url'], order, time.monotonic())
+                done, _ = concurrent.futures.wait(list(extracting), return_when=concurrent.futures.FIRST_COMPLETED)
+                for future in done:
+                    url, order, submitted = extracting.pop(future)
+                    self.metrics.observe('extract.roundtrip', time.monotonic() - submitted)
+                    self.visited_urls.add(url)
+                    try:
+                        self.handle_extracted(url, future.result(), order)
+                    except Exception as e:
+                        self.logger.error(f"Error processing {url}: {str(e)}")
+                self.sample_progress(0, len(extracting))
+        finally:
+            pool.shutdown()
 
+    def save_results(self):
+        filename = self.writer.close()
         self.logger.info(f"Results saved to {filename}")
         return filename
 
@@ -206,34 +1814,65 @@ class WebCrawler:
         with open(log_filename, 'w', encoding='utf-8') as f:
             f.write(f"初始URL和模式列表: {self.initial_urls + self.url_patterns}\n")
             f.write(f"获得URL数量: {len(self.visited_urls)}\n")
-            f.write(f"抓取URL数量: {len(self.results)}\n")
+            f.write(f"抓取URL数量: {self.pages_crawled}\n")
             f.write(f"抛弃URL数量: {len(self.ignored_urls)}\n")
             f.write(f"抓取总字数: {self.total_chars}\n")
-            f.write(f"生成文件大小: {self.get_file_size(output_file)} bytes\n")
+            f.write(f"重复页面数量: {len(self.duplicates)}\n")
+            f.write(f"缓存命中数量(304): {self.cache_hits}\n")
+            if self.use_sitemaps:
+                counters = self.metrics.counters
+                f.write(f"Sitemap: 读取{counters['sitemap.files']}个文件, 补充{counters['sitemap.seeded']}个URL, "
+                        f"未变化直接用缓存{counters['sitemap.unchanged']}页\n")
+            decode_counts = {name.split('.', 1)[1]: count for name, count in self.metrics.counters.items()
+                             if name.startswith('decode.')}
+            if decode_counts:
+                f.write(f"解码方式: {decode_counts}\n")
+            for host, host_stats in self.scheduler.stats().items():
+                f.write(f"主机 {host}: 请求{host_stats['requests']}次, 限流{host_stats['throttled']}次, "
+                        f"错误{host_stats['errors']}次, 当前并发{host_stats['concurrency']}, "
+                        f"平均延迟{host_stats['latency']}秒\n")
+            match_stats = self.url_matcher.stats
+            f.write(f"URL匹配: 调用{match_stats['calls']}次, 决策缓存命中{match_stats['cache_hits']}次, "
+                    f"匹配耗时{match_stats['match_time']:.3f}秒\n")
+            f.write(f"生成文件大小: {sum(self.get_file_size(shard) for shard in self.writer.shards)} bytes\n")
+            if len(self.writer.shards) > 1:
+                f.write(f"生成文件列表: {self.writer.shards}\n")
+
+            if self.strategy:
+                for template, preferred, hits, pages in self.strategy.report():
+                    f.write(f"提取策略 {template}: 首选{preferred}, 命中{hits}/{pages}\n")
 
             f.write("\n获得URL列表:\n")
             for url in self.visited_urls:
                 f.write(f"- {url}\n")
 
+            # 抓取列表直接读索引文件，不再从正文中反解析 URL
             f.write("\n抓取URL列表:\n")
-            for result in self.results:
-                lines = result.split('\n')
-                if len(lines) > 1:
-                    url_line = lines[1]
-                    url_parts = url_line.split('URL: ')
-                    if len(url_parts) > 1:
-                        url = url_parts[1].rstrip(')')
-                        f.write(f"- {url}\n")
-                    else:
-                        f.write(f"- URL not found in result\n")
-                else:
-                    f.write(f"- Malformed result\n")
+            for record in self.writer.iter_index():
+                f.write(f"- {record['url']}\n")
+
+            f.write("\n重复页面列表:\n")
+            for url, canonical in self.duplicates:
+                f.write(f"- {url} -> {canonical}\n")
 
             f.write("\n抛弃URL列表:\n")
             for url in self.ignored_urls:
                 f.write(f"- {url}\n")
 
         self.logger.info(f"Log saved to {log_filename}")
+        self.save_metrics(output_file, timestamp)
+
+    def save_metrics(self, output_file, timestamp=None):
+        """Write the machine-readable per-stage timing report next to the log."""
+        timestamp = timestamp or datetime.now().strftime("%Y%m%d-%H%M%S")
+        metrics_filename = f"{output_file.rsplit('.', 1)[0]}-metrics-{timestamp}.json"
+        report = self.metrics.report(self.pages_crawled)
+        report['hosts'] = self.scheduler.stats()
+        report['url_matcher'] = dict(self.url_matcher.stats)
+        with open(metrics_filename, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        self.logger.info(f"Metrics saved to {metrics_filename}")
+        return metrics_filename
 
     @staticmethod
     def get_file_size(filename):
@@ -255,16 +1894,59 @@ def main():
         r".*\.(js|css|png|jpg|jpeg|gif|svg)$"  # 忽略资源文件
     ]
 
+    parser = argparse.ArgumentParser(description="Crawl documentation sites into LLM-ready text.")
+    parser.add_argument('--config', default=CONFIG_FILE, help="crawler configuration JSON file")
+    parser.add_argument('--resume', action='store_true', help="continue an interrupted crawl from state_db")
+    parser.add_argument('--re-extract', action='store_true',
+                        help="rebuild the output from archive_dir with the current extractors, without fetching")
+    args = parser.parse_args()
+
     logging.basicConfig(level=logging.DEBUG)  # 设置日志级别为 DEBUG
     logger = logging.getLogger(__name__)
 
-    crawler = WebCrawler(initial_urls, url_patterns, ignore_patterns)
-    crawler.crawl()
+    # 配置文件中的配置优先于上面的默认值
+    config = load_config(args.config)
+    crawler = WebCrawler(
+        config.get("initial_urls", initial_urls),
+        config.get("url_patterns", url_patterns),
+        config.get("ignore_patterns", ignore_patterns),
+        max_urls=config.get("max_urls", 100),
+        max_workers=config.get("max_workers", 10),
+        http_cache_dir=config.get("http_cache_dir"),
+        extract_workers=config.get("extract_workers"),
+        extract_queue_size=config.get("extract_queue_size"),
+        output_format=config.get("output_format", "markdown"),
+        shard_max_bytes=config.get("shard_max_bytes", 0),
+        max_runtime=config.get("max_runtime", 0),
+        stop_file=config.get("stop_file"),
+        crawl_delay=config.get("crawl_delay", 0),
+        max_retries=config.get("max_retries", 3),
+        retry_backoff=config.get("retry_backoff", 1.0),
+        duplicate_threshold=config.get("duplicate_threshold", 0.95),
+        duplicate_action=config.get("duplicate_action", "drop"),
+        learn_extractors=config.get("learn_extractors", True),
+        progress_interval=config.get("progress_interval", 0),
+        archive_dir=config.get("archive_dir"),
+        use_sitemaps=config.get("use_sitemaps", False),
+        sitemap_urls=config.get("sitemap_urls"),
+        max_sitemaps=config.get("max_sitemaps", 50),
+        # 重新提取不修改断点续爬状态
+        state_db=None if args.re_extract else config.get("state_db"),
+    )
+    if args.resume and not crawler.state:
+        parser.error("--resume requires state_db in the configuration")
+    if args.re_extract:
+        if not crawler.archive:
+            parser.error("--re-extract requires archive_dir in the configuration")
+        crawler.re_extract()
+    else:
+        crawler.crawl(resume=args.resume)
+    crawler.close()
     output_file = crawler.save_results()
     crawler.save_log(output_file)
 
     logger.info(f"Total URLs visited: {len(crawler.visited_urls)}")
-    logger.info(f"Total pages crawled: {len(crawler.results)}")
+    logger.info(f"Total pages crawled: {crawler.pages_crawled}")
     logger.info(f"Total URLs ignored: {len(crawler.ignored_urls)}")
 
 if __name__ == "__main__":
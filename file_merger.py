@@ -1,114 +1,340 @@
 import os
+import json
 import time
+import glob
+import hashlib
+import codecs
+import argparse
+import concurrent.futures
+from collections import deque
 from datetime import datetime
-import fnmatch
+from ignore_matcher import DEFAULT_IGNORE, IgnoreMatcher
 
-# Define the list of files and patterns to ignore
-IGNORE_LIST = [
+# Files and patterns to ignore on top of the shared defaults (.gitignore syntax; .gitignore files are read too)
+IGNORE_LIST = DEFAULT_IGNORE + [
     'config.css',
-    'readme.md',
-    'file_merger.py',
     'ollama-api-readme.md',
-    '.DS_Store',
     'styles.css',
     'icon*.png',
-    'node_modules',
-    'readme.md',
-    '.next',
-    '.git',
-    '.gitignore',
-    '.vscode',
-    '.idea',
-    '.contentlayer',
-    'LICENSE*',
-    'file_merger.py',
-    'HaxiTAG-DirectoryExplorer.py',
-    'SECURITY.md',
-    'CODE_OF_CONDUCT.md',
-    '.eslintrc.json',
-    '需求说明.md',
-    '*-目录.txt',
-    'README.md.txt',
-    '*.npmrc',
-    '*/.DS_Store',
-    '*.DS_Store',
-    '*.log',
-    '.env.local',
-    'findIncorrectLinks.js',
-    'check-env-permissions.js',
-    'HaxiTAG_file_merger.py',
-    'posts/*',
     'images/*',
     'logo/*',
 
     # Add more files or patterns to ignore as needed
 ]
 
-def should_ignore(file_path):
-    """Check if the file should be ignored based on the IGNORE_LIST."""
-    for pattern in IGNORE_LIST:
-        if fnmatch.fnmatch(file_path.lower(), pattern.lower()):
-  return True
-    return False
+# Bytes read from the start of a file to decide whether it is mergeable text
+SNIFF_BYTES = 8192
+# Control characters other than tab, newline, form feed, carriage return and escape mark binary data
+BINARY_CONTROL_BYTES = bytes(set(range(32)) - {8, 9, 10, 12, 13, 27})
+# A sample whose lines average this many characters is minified or generated, not readable source
+MAX_AVERAGE_LINE_LENGTH = 1000
+# Recorded in the merge manifest: sections classified under other settings are never reused
+CLASSIFIER = {'version': 1, 'sniff_bytes': SNIFF_BYTES, 'max_average_line_length': MAX_AVERAGE_LINE_LENGTH}
 
-def is_text_file(file_path):
-    text_extensions = ['.js', '.css', '.html', '.json', '.txt', '.md', '.py', '.xml', '.csv','.tsx','.log']
-    return any(file_path.lower().endswith(ext) for ext in text_extensions)
+def sniff_file(file_path, sample_size=SNIFF_BYTES):
+    """Classify a file as 'text', 'binary' or 'minified' from a bounded prefix of its content."""
+    with open(file_path, 'rb') as file:
+        sample = file.read(sample_size)
+    if b'\0' in sample:
+        return 'binary'
+    try:
+        # A multi-byte character may be cut at the end of the sample; final=False tolerates that
+        text = codecs.getincrementaldecoder('utf-8')().decode(sample, final=False)
+    except UnicodeDecodeError:
+        return 'binary'
+    if len(sample.translate(None, BINARY_CONTROL_BYTES)) < len(sample) * 0.9:
+        return 'binary'
+    lines = text.count('\n') + 1
+    if len(text) >= sample_size // 2 and len(text) / lines > MAX_AVERAGE_LINE_LENGTH:
+        return 'minified'
+    return 'text'
 
 def read_file_content(file_path):
     try:
         with open(file_path, 'r', encoding='utf-8') as file:
-  return file.read()
+            return file.read()
     except Exception as e:
         print(f"Error reading file {file_path}: {str(e)}")
         return f"Error reading file: {str(e)}"
 
-def process_directory(directory):
-    content = []
-    dir_name = os.path.basename(directory)
-    
-    # Add the directory name at the beginning
-    content.append(f"# {dir_name}")
-    content.append('--')
+# Files larger than this are copied to the output in chunks instead of being read whole
+STREAM_THRESHOLD = 4 * 1024 * 1024
+COPY_CHUNK_SIZE = 1024 * 1024
 
-    for root, dirs, files in os.walk(directory):
-        # Remove ignored directories
-        dirs[:] = [d for d in dirs if not should_ignore(os.path.join(root, d))]
-        
+def iter_files(directory, exclude=()):
+    """Yield (file_path, rel_file_path) in a stable, sorted walk order."""
+    matcher = IgnoreMatcher(directory, IGNORE_LIST)
+    # Ignored directories are pruned by the matcher before os.walk descends into them
+    for root, rel_dir, dirs, files in matcher.walk():
         for file in files:
-  file_path = os.path.join(root, file)
-  rel_file_path = os.path.relpath(file_path, directory)
-  
-  # Check if the file should be ignored
-  if should_ignore(rel_file_path):
-      print(f"Ignoring file: {rel_file_path}")
-      continue
+            file_path = os.path.join(root, file)
+            if file_path in exclude:
+                continue
+            yield file_path, os.path.relpath(file_path, directory)
+
+def load_section(file_path, max_file_size=0, kind=None):
+    """Prepare one file's section body; large files are left for the writer to stream.
+
+    Returns (kind, mode, body); a kind known from the previous manifest skips sniffing.
+    """
+    file = os.path.basename(file_path)
+    try:
+        size = os.path.getsize(file_path)
+        kind = kind or sniff_file(file_path)
+    except OSError as e:
+        print(f"Error reading file {file_path}: {str(e)}")
+        return 'error', 'text', f"Error reading file: {str(e)}"
+    if kind == 'binary':
+        return kind, 'text', f"Binary file: {file}"
+    if kind == 'minified':
+        return kind, 'text', f"Minified file: {file} ({size} bytes)"
+    if max_file_size and size > max_file_size:
+        return kind, 'text', f"File too large: {file} ({size} bytes)"
+    if size > STREAM_THRESHOLD:
+        return kind, 'stream', None
+    return kind, 'text', read_file_content(file_path)
+
+def copy_file_content(file_path, writer):
+    """Copy a large text file into the output in fixed-size chunks."""
+    try:
+        with open(file_path, 'r', encoding='utf-8') as file:
+            while True:
+                chunk = file.read(COPY_CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+    except Exception as e:
+        print(f"Error reading file {file_path}: {str(e)}")
+        writer.write(f"Error reading file: {str(e)}")
 
-  # Add the full path with directory name and '#' prefix
-  content.append(f"# {dir_name}/{rel_file_path}")
+class MergeWriter:
+    """Binary output wrapper that tracks byte offsets and hashes section bodies."""
 
-  if is_text_file(file_path):
-      file_content = read_file_content(file_path)
-      content.append(file_content)
-  else:
-      content.append(f"Binary file: {file}")
+    def __init__(self, output_file):
+        self.file = output_file
+        self.position = 0
+        self.hasher = None
 
-  content.append('--')
+    def write(self, text):
+        data = text.encode('utf-8')
+        self.file.write(data)
+        self.position += len(data)
+        if self.hasher:
+            self.hasher.update(data)
 
-    return '\n'.join(content)
+    def begin_section(self):
+        self.hasher = hashlib.sha256()
+        return self.position
+
+    def end_section(self):
+        digest = self.hasher.hexdigest()
+        self.hasher = None
+        return digest
+
+    def splice(self, source, offset, length):
+        """Copy bytes [offset, offset + length) of a previous output, in-kernel where possible."""
+        self.file.flush()
+        remaining = length
+        try:
+            while remaining:
+                copied = os.copy_file_range(source.fileno(), self.file.fileno(), remaining, offset)
+                if not copied:
+                    raise OSError("copy_file_range copied nothing")
+                offset += copied
+                remaining -= copied
+        except (AttributeError, OSError):
+            # Not Linux, or the files are on different filesystems: fall back to a plain copy
+            source.seek(offset)
+            while remaining:
+                chunk = source.read(min(COPY_CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise OSError("previous output is shorter than its manifest")
+                self.file.write(chunk)
+                remaining -= len(chunk)
+        self.position += length
+
+def load_manifest(manifest_path):
+    """Return the previous merge manifest, or None if there is no readable one."""
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as file:
+            manifest = json.load(file)
+        if isinstance(manifest.get('files'), dict):
+            return manifest
+    except (OSError, ValueError):
+        pass
+    return None
+
+def can_splice(manifest, options, directory):
+    """Sections can be copied from the previous output only if it was built from the same directory with the
+    same options and is intact."""
+    try:
+        return manifest.get('directory') == directory and manifest.get('options') == options \
+            and os.path.getsize(manifest['output']) == manifest['size']
+    except (OSError, KeyError):
+        return False
+
+def save_manifest(manifest_path, manifest):
+    tmp_path = f"{manifest_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as file:
+        json.dump(manifest, file, ensure_ascii=False)
+    os.replace(tmp_path, manifest_path)
+
+def process_directory(directory, output_file, workers=8, max_file_size=0, max_total_size=0, previous=None,
+                      exclude=(), known=None):
+    """Stream the merged sections of a directory to a binary file; returns {rel path: section metadata}.
+
+    Files are read ahead by a bounded thread pool but written strictly in walk order. Files whose
+    size and mtime match the previous manifest are spliced from the previous output instead of read;
+    known maps paths to older section metadata whose sniffed kind is reused when size and mtime match.
+    """
+    dir_name = os.path.basename(directory)
+    writer = MergeWriter(output_file)
+    # Add the directory name at the beginning
+    writer.write(f"# {dir_name}\n--")
+    # The output file is written while the tree is walked; never merge it into itself
+    exclude = set(exclude) | {os.path.abspath(output_file.name)}
+    previous_files = previous['files'] if previous else {}
+    known = known or {}
+    source = open(previous['output'], 'rb') if previous else None
+    sections = {}
+
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            files = iter_files(directory, exclude)
+            while True:
+                # Keep a bounded window of reads in flight so memory stays flat
+                while len(pending) < workers * 2:
+                    entry = next(files, None)
+                    if entry is None:
+                        break
+                    file_path, rel_file_path = entry
+                    try:
+                        stat = os.stat(file_path)
+                    except OSError as e:
+                        # Dangling symlink or a file removed during the walk: write an error section, keep going
+                        print(f"Error reading file {file_path}: {str(e)}")
+                        pending.append((entry, None, None, f"Error reading file: {str(e)}"))
+                        continue
+                    cached = previous_files.get(rel_file_path)
+                    if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+                        pending.append((entry, stat, cached, None))
+                    else:
+                        old = known.get(rel_file_path)
+                        kind = old.get('kind') if old and old.get('size') == stat.st_size \
+                            and old.get('mtime_ns') == stat.st_mtime_ns else None
+                        pending.append((entry, stat, None, pool.submit(load_section, file_path, max_file_size, kind)))
+                if not pending:
+                    break
+                (file_path, rel_file_path), stat, cached, future = pending.popleft()
+
+                if max_total_size and writer.position >= max_total_size:
+                    print(f"Output size limit reached, skipping: {rel_file_path}")
+                    for _, _, _, future in pending:
+                        if isinstance(future, concurrent.futures.Future):
+                            future.cancel()
+                    pending.clear()
+                    writer.write(f"\n# Output size limit of {max_total_size} bytes reached")
+                    break
+
+                # Add the full path with directory name and '#' prefix
+                writer.write(f"\n# {dir_name}/{rel_file_path}\n")
+                if stat is None:
+                    # Not recorded in the manifest, so the next run looks at the path again
+                    writer.write(future)
+                    writer.write('\n--')
+                    continue
+                offset = writer.begin_section()
+                if cached:
+                    writer.splice(source, cached['offset'], cached['length'])
+                    writer.end_section()
+                    digest = cached['sha256']
+                    kind = cached.get('kind')
+                else:
+                    kind, mode, section = future.result()
+                    if mode == 'stream':
+                        copy_file_content(file_path, writer)
+                    else:
+                        writer.write(section)
+                    digest = writer.end_section()
+                sections[rel_file_path] = {
+                    'size': stat.st_size,
+                    'mtime_ns': stat.st_mtime_ns,
+                    'offset': offset,
+                    'length': writer.position - offset,
+                    'sha256': digest,
+                    'kind': kind,
+                    'reused': bool(cached),
+                }
+                writer.write('\n--')
+    finally:
+        if source:
+            source.close()
+
+    return sections
 
 def main():
-    current_dir = os.getcwd()
+    parser = argparse.ArgumentParser(description="Merge the text files of a directory into one context file.")
+    parser.add_argument('directory', nargs='?', default=os.getcwd(), help="directory to merge (default: current)")
+    parser.add_argument('--workers', type=int, default=8, help="files read ahead in parallel")
+    parser.add_argument('--max-file-size', type=int, default=0,
+                        help="skip files larger than this many bytes (0: no limit)")
+    parser.add_argument('--max-total-size', type=int, default=0,
+                        help="stop adding files once the output has this many bytes (0: no limit)")
+    parser.add_argument('--full', action='store_true', help="ignore the merge manifest and re-read every file")
+    parser.add_argument('--index', action='store_true',
+                        help="also write <output>.index.jsonl with each file's byte offset, length and sha256")
+    args = parser.parse_args()
+
+    current_dir = os.path.abspath(args.directory)
     dir_name = os.path.basename(current_dir)
     timestamp = int(time.time() * 1000)  # 13-digit millisecond timestamp
     output_filename = f"{dir_name}-{timestamp}.txt"
 
-    content = process_directory(current_dir)
+    # Unchanged files are copied from the previous output recorded in this manifest
+    manifest_path = os.path.abspath(f"{dir_name}-merge-manifest.json")
+    options = {'max_file_size': args.max_file_size, 'max_total_size': args.max_total_size, 'classifier': CLASSIFIER}
+    manifest = None if args.full else load_manifest(manifest_path)
+    # The manifest is named after the directory's basename only; ignore one written for another tree
+    if manifest and manifest.get('directory') != current_dir:
+        manifest = None
+    previous = manifest if manifest and can_splice(manifest, options, current_dir) else None
+    # Sniffed kinds stay valid across size options, but not across classifier changes
+    known = manifest['files'] if manifest and (manifest.get('options') or {}).get('classifier') == CLASSIFIER else None
+    # Earlier merge outputs and their indexes may sit inside the merged directory; keep them out of the new one
+    exclude = {manifest_path} | {os.path.abspath(path) for pattern in ('-[0-9]*.txt', '-[0-9]*.index.jsonl')
+                                 for path in glob.glob(glob.escape(dir_name) + pattern)}
+
+    with open(output_filename, 'wb') as output_file:
+        sections = process_directory(current_dir, output_file, max(1, args.workers), args.max_file_size,
+                                     args.max_total_size, previous, exclude, known)
+        size = output_file.tell()
+
+    if args.index:
+        # Offsets point at the first byte of each file's content, after its "# path" header line
+        index_filename = f"{os.path.splitext(output_filename)[0]}.index.jsonl"
+        with open(index_filename, 'w', encoding='utf-8') as index_file:
+            for rel_file_path, section in sections.items():
+                index_file.write(json.dumps({
+                    'path': rel_file_path,
+                    'offset': section['offset'],
+                    'length': section['length'],
+                    'sha256': section['sha256'],
+                    'kind': section['kind'],
+                }, ensure_ascii=False) + '\n')
 
-    with open(output_filename, 'w', encoding='utf-8') as output_file:
-        output_file.write(content)
+    reused = sum(1 for section in sections.values() if section.pop('reused'))
+    save_manifest(manifest_path, {
+        'directory': current_dir,
+        'output': os.path.abspath(output_filename),
+        'size': size,
+        'options': options,
+        'files': sections,
+    })
 
-    print(f"File created: {output_filename}")
+    print(f"File created: {output_filename} ({len(sections)} files, {reused} reused from the previous output)")
+    if args.index:
+        print(f"Index created: {index_filename}")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
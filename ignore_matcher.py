@@ -0,0 +1,227 @@
+import os
+import re
+
+# Shared ignore rules for file_merger.py and project-structure-Explorer.py, with .gitignore semantics:
+# - a pattern without '/' matches a file or directory name at any depth ('*.log', 'node_modules')
+# - a pattern containing '/' is relative to the directory it belongs to ('posts/*', 'docs/build')
+# - a trailing '/' matches directories only, a leading '!' re-includes, '**' spans directories
+# Matching is case-insensitive, like the lower()-both-sides fnmatch checks it replaces.
+DEFAULT_IGNORE = [
+    'node_modules',
+    'readme.md',
+    '.next',
+    '.git',
+    '.gitignore',
+    '.vscode',
+    '.idea',
+    '.contentlayer',
+    'LICENSE*',
+    'file_merger.py',
+    'HaxiTAG-DirectoryExplorer.py',
+    'SECURITY.md',
+    'CODE_OF_CONDUCT.md',
+    '.eslintrc.json',
+    '需求说明.md',
+    '*-目录.txt',
+    '*-目录.json',
+    '*-目录.jsonl',
+    'README.md.txt',
+    '*.npmrc',
+    '.DS_Store',
+    '*.log',
+    '.env.local',
+    'findIncorrectLinks.js',
+    'check-env-permissions.js',
+    'HaxiTAG_file_merger.py',
+    'posts/*',
+]
+
+_WILDCARDS = set('*?[\\')
+
+
+def translate(pattern):
+    """Translate a gitignore glob (without anchors) into a regular expression."""
+    parts = []
+    i, n = 0, len(pattern)
+    while i < n:
+        char = pattern[i]
+        if char == '*':
+            if pattern.startswith('**', i):
+                if pattern.startswith('**/', i):
+                    # '**/' matches zero or more whole directories
+                    parts.append('(?:.*/)?')
+                    i += 3
+                else:
+                    parts.append('.*')
+                    i += 2
+                continue
+            parts.append('[^/]*')
+        elif char == '?':
+            parts.append('[^/]')
+        elif char == '[':
+            end = pattern.find(']', i + 2)
+            if end == -1:
+                parts.append(re.escape(char))
+            else:
+                body = pattern[i + 1:end].replace('\\', '\\\\')
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                parts.append(f"[{body}]")
+                i = end + 1
+                continue
+        elif char == '\\' and i + 1 < n:
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    return ''.join(parts)
+
+
+class IgnoreRule:
+    def __init__(self, line, base=''):
+        self.negate = line.startswith('!')
+        if self.negate:
+            line = line[1:]
+        self.dir_only = line.endswith('/')
+        line = line.rstrip('/')
+        self.anchored = '/' in line
+        self.glob = line.lstrip('/')
+        prefix = f"{re.escape(base)}/" if base else ''
+        anywhere = '' if self.anchored else '(?:.*/)?'
+        self.pattern = f"{prefix}{anywhere}{translate(self.glob)}"
+
+    @property
+    def literal_name(self):
+        return not self.anchored and not _WILDCARDS & set(self.glob)
+
+    @property
+    def suffix(self):
+        """'.log' for a plain '*.log' pattern, else None."""
+        rest = self.glob[1:]
+        if not self.anchored and self.glob.startswith('*') and rest and not _WILDCARDS & set(rest):
+            return rest
+        return None
+
+
+class IgnorePatterns:
+    """One list of ignore rules (the configured list or one .gitignore), compiled once.
+
+    Literal names and '*.ext' patterns are answered with set lookups; the remaining patterns share one
+    combined regex. Lists with '!' rules are evaluated in order, since the last matching rule wins.
+    """
+
+    def __init__(self, lines, base='', ignore_case=True):
+        self.base = base
+        self.ignore_case = ignore_case
+        flags = re.IGNORECASE if ignore_case else 0
+        self.rules = [IgnoreRule(line, base) for line in (line.strip() for line in lines)
+                      if line and not line.startswith('#')]
+        self.ordered = any(rule.negate for rule in self.rules)
+        if self.ordered:
+            self.regexes = [(re.compile(rule.pattern, flags), rule) for rule in self.rules]
+            return
+        self.names = [set(), set()]     # [any entry, directories only]
+        self.suffixes = [set(), set()]
+        patterns = [[], []]
+        for rule in self.rules:
+            kind = int(rule.dir_only)
+            if rule.literal_name and not base:
+                self.names[kind].add(self._fold(rule.glob))
+            elif rule.suffix and not base:
+                self.suffixes[kind].add(self._fold(rule.suffix))
+            else:
+                patterns[kind].append(rule.pattern)
+        self.combined = [re.compile('|'.join(f"(?:{p})" for p in group), flags) if group else None
+                         for group in patterns]
+        self.suffix_lengths = [sorted({len(s) for s in group}) for group in self.suffixes]
+
+    def _fold(self, text):
+        return text.lower() if self.ignore_case else text
+
+    def match(self, rel_path, is_dir=False):
+        """True if ignored, False if explicitly re-included, None if no rule applies."""
+        if self.base and not rel_path.startswith(self.base + '/'):
+            return None
+        if self.ordered:
+            for regex, rule in reversed(self.regexes):
+                if (is_dir or not rule.dir_only) and regex.fullmatch(rel_path):
+                    return not rule.negate
+            return None
+        name = self._fold(rel_path.rsplit('/', 1)[-1])
+        for kind in ((0, 1) if is_dir else (0,)):
+            if name in self.names[kind]:
+                return True
+            if any(name[-length:] in self.suffixes[kind] for length in self.suffix_lengths[kind]
+                   if len(name) >= length):
+                return True
+            if self.combined[kind] and self.combined[kind].fullmatch(rel_path):
+                return True
+        return None
+
+
+class IgnoreMatcher:
+    """Decide which paths under root are ignored, combining the configured rules with .gitignore files."""
+
+    def __init__(self, root, patterns=DEFAULT_IGNORE, use_gitignore=True, ignore_case=True):
+        self.root = root
+        self.ignore_case = ignore_case
+        self.use_gitignore = use_gitignore
+        self.patterns = IgnorePatterns(patterns, ignore_case=ignore_case)
+        self.layer_cache = {}
+        self.dir_cache = {}
+
+    def _gitignore(self, rel_dir):
+        path = os.path.join(self.root, rel_dir, '.gitignore')
+        try:
+            with open(path, 'r', encoding='utf-8', errors='replace') as f:
+                return IgnorePatterns(f.read().splitlines(), rel_dir, self.ignore_case)
+        except OSError:
+            return None
+
+    def layers(self, rel_dir):
+        """Rule lists that apply inside rel_dir, outermost first; cached per directory."""
+        layers = self.layer_cache.get(rel_dir)
+        if layers is None:
+            if rel_dir:
+                parent = rel_dir.rsplit('/', 1)[0] if '/' in rel_dir else ''
+                layers = list(self.layers(parent))
+            else:
+                layers = [self.patterns]
+            gitignore = self._gitignore(rel_dir) if self.use_gitignore else None
+            if gitignore and gitignore.rules:
+                layers.append(gitignore)
+            self.layer_cache[rel_dir] = layers
+        return layers
+
+    def is_ignored(self, rel_path, is_dir=False):
+        """Check one path relative to root; parents are not checked (walk() prunes them)."""
+        rel_path = rel_path.replace(os.sep, '/')
+        if is_dir:
+            cached = self.dir_cache.get(rel_path)
+            if cached is not None:
+                return cached
+        rel_dir = rel_path.rsplit('/', 1)[0] if '/' in rel_path else ''
+        decision = None
+        for layer in self.layers(rel_dir):
+            result = layer.match(rel_path, is_dir)
+            if result is not None:
+                decision = result
+        ignored = bool(decision)
+        if is_dir:
+            self.dir_cache[rel_path] = ignored
+        return ignored
+
+    def walk(self):
+        """Like os.walk(root) in sorted order, but ignored directories are pruned before descending.
+
+        Yields (dirpath, rel_dir, dirnames, filenames) with ignored entries already removed.
+        """
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            rel_dir = os.path.relpath(dirpath, self.root).replace(os.sep, '/')
+            rel_dir = '' if rel_dir == '.' else rel_dir
+            prefix = f"{rel_dir}/" if rel_dir else ''
+            dirnames[:] = sorted(d for d in dirnames if not self.is_ignored(prefix + d, True))
+            filenames = sorted(f for f in filenames if not self.is_ignored(prefix + f))
+            yield dirpath, rel_dir, dirnames, filenames
@@ -1,44 +1,35 @@
 import os
-import sys
-import fnmatch
+import json
+import argparse
+import concurrent.futures
+from ignore_matcher import DEFAULT_IGNORE, IgnoreMatcher
+
+class DirectoryFrame:
+    """One directory on the traversal stack, with running totals of what was kept below it."""
+
+    def __init__(self, path, rel_path, depth, is_last=True):
+        self.path = path
+        self.rel_path = rel_path
+        self.depth = depth          # depth of the entries listed in this directory
+        self.is_last = is_last
+        self.entries = []
+        self.index = 0
+        self.prefetched = {}
+        self.files = 0
+        self.dirs = 0
+        self.bytes = 0
 
 class DirectoryExplorer:
-    def __init__(self, root_path, max_depth=10, max_files=100):
+    def __init__(self, root_path, max_depth=10, max_files=100, workers=1):
         self.root_path = root_path
         self.max_depth = max_depth
         self.max_files = max_files
-        self.output = []
+        self.workers = workers
         self.deep_directories = set()
         self.large_directories = set()
-        self.IGNORE_LIST = [
-            'node_modules',
-            'readme.md',
-            '.next',
-            '.git',
-            '.gitignore',
-            '.vscode',
-            '.idea',
-            '.contentlayer',
-            'LICENSE*',
-            'file_merger.py',
-            'HaxiTAG-DirectoryExplorer.py',
-            'SECURITY.md',
-            'CODE_OF_CONDUCT.md',
-            '.eslintrc.json',
-            '需求说明.md',
-            '*-目录.txt',
-            'README.md.txt',
-            '*.npmrc',
-            '*/.DS_Store',
-            '*.DS_Store',
-            '*.log',
-            '.env.local',
-            'findIncorrectLinks.js',
-            'check-env-permissions.js',
-            'HaxiTAG_file_merger.py',
-            'posts/*',
-            '*/images/*',
-            '*/logo/*',
+        self.IGNORE_LIST = DEFAULT_IGNORE + [
+            '**/images/*',
+            '**/logo/*',
             '.dockerignore',
             '.nvmrc',
             'Dockerfile',
@@ -47,82 +38,179 @@ class DirectoryExplorer:
             'scan-link-error.js',
             'check-links.js',
             'feishu-token-generator.js',
-            'scan-link-error.js',
             'privacy-policy.md'
         ]
+        self.matcher = IgnoreMatcher(root_path, self.IGNORE_LIST)
 
-    def should_ignore(self, file_path):
-        for pattern in self.IGNORE_LIST:
-            if fnmatch.fnmatch(file_path.lower(), pattern.lower()):
-                return True
-        return False
+    def should_ignore(self, file_path, is_dir=False):
+        return self.matcher.is_ignored(file_path, is_dir)
 
-    def explore(self):
-        self.output = [f"/{os.path.basename(self.root_path)}"]
-        self._explore_recursive(self.root_path, 0)
-        
-        dir_name = os.path.basename(self.root_path)
-        output_filename = f"{dir_name}-目录.txt"
-        
-        with open(output_filename, 'w', encoding='utf-8') as f:
-            f.write('\n'.join(self.output))
-            
-            if self.deep_directories:
-                f.write('\n\n以下目录深度超过10级：\n')
-                for dir_path in self.deep_directories:
-                    f.write(f"- {dir_path}\n")
-            
-            if self.large_directories:
-                f.write('\n\n以下目录包含超过100个文件：\n')
-                for dir_path in self.large_directories:
-                    f.write(f"- {dir_path}\n")
-        
-        print(f"目录列表已保存到 {output_filename}")
+    def scan(self, path, rel_path):
+        """List one directory with os.scandir; returns (kept entries sorted by name, number of items)."""
+        try:
+            with os.scandir(path) as it:
+                items = list(it)
+        except OSError:
+            return [], 0
 
-    def _explore_recursive(self, current_path, depth):
-        if depth > self.max_depth:
-            self.deep_directories.add(current_path)
-            return
+        prefix = f"{rel_path}/" if rel_path else ''
+        entries = []
+        for entry in items:
+            # is_dir() and stat() reuse the d_type and stat results cached on the DirEntry
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            entry_rel_path = prefix + entry.name
+            if self.should_ignore(entry_rel_path, is_dir):
+                continue
+            size = 0
+            if not is_dir:
+                try:
+                    size = entry.stat().st_size
+                except OSError:
+                    pass
+            entries.append((entry.name, entry.path, entry_rel_path, is_dir, size))
+        entries.sort()
+        return entries, len(items)
 
-        try:
-            items = sorted(os.listdir(current_path))
-        except PermissionError:
-            return
-
-        if len(items) > self.max_files:
-            self.large_directories.add(current_path)
-
-        prefix = '│   ' * depth
-        for i, item in enumerate(items):
-            item_path = os.path.join(current_path, item)
-            relative_item_path = os.path.relpath(item_path, self.root_path)
-            
-            if self.should_ignore(relative_item_path):
+    def open_directory(self, frame, pool=None, listing=None):
+        """Fill a frame's entries and start prefetching its subdirectories' listings on the pool."""
+        if frame.depth > self.max_depth:
+            self.deep_directories.add(frame.path)
+            return frame
+        frame.entries, count = listing.result() if listing else self.scan(frame.path, frame.rel_path)
+        if count > self.max_files:
+            self.large_directories.add(frame.path)
+        if pool and frame.depth < self.max_depth:
+            frame.prefetched = {path: pool.submit(self.scan, path, rel_path)
+                                for _, path, rel_path, is_dir, _ in frame.entries if is_dir}
+        return frame
+
+    def walk(self, pool=None):
+        """Walk the tree depth-first in name order, without recursion.
+
+        Yields ('entry', depth, name, rel_path, is_dir, size, is_last) for every kept entry, and
+        ('close', frame) once a directory's contents are done, with totals counted over its subtree.
+        """
+        stack = [self.open_directory(DirectoryFrame(self.root_path, '', 0), pool)]
+        while stack:
+            frame = stack[-1]
+            if frame.index < len(frame.entries):
+                name, path, rel_path, is_dir, size = frame.entries[frame.index]
+                frame.index += 1
+                # is_last is decided over the entries left after ignoring, so the last connector is right
+                is_last = frame.index == len(frame.entries)
+                yield 'entry', frame.depth, name, rel_path, is_dir, size, is_last
+                if is_dir:
+                    child = DirectoryFrame(path, rel_path, frame.depth + 1, is_last)
+                    stack.append(self.open_directory(child, pool, frame.prefetched.pop(path, None)))
+                else:
+                    frame.files += 1
+                    frame.bytes += size
                 continue
+            stack.pop()
+            if stack:
+                parent = stack[-1]
+                parent.files += frame.files
+                parent.dirs += frame.dirs + 1
+                parent.bytes += frame.bytes
+            yield 'close', frame
 
-            is_last = (i == len(items) - 1)
-            if is_last:
-                branch = '└── '
+    def write_text(self, events, f):
+        f.write(f"/{os.path.basename(self.root_path)}")
+        for event in events:
+            if event[0] == 'entry':
+                _, depth, name, _, is_dir, _, is_last = event
+                branch = '└── ' if is_last else '├── '
+                f.write(f"\n{'│   ' * depth}{branch}{name}")
+                if is_last and depth > 0 and not is_dir:
+                    f.write(f"\n{'│   ' * depth}")
             else:
-                branch = '├── '
+                # A directory's closing spacer comes after its whole subtree
+                frame = event[1]
+                depth = frame.depth - 1
+                if frame.is_last and depth > 0:
+                    f.write(f"\n{'│   ' * depth}")
 
-            if os.path.isdir(item_path):
-                self.output.append(f"{prefix}{branch}{item}")
-                self._explore_recursive(item_path, depth + 1)
+        if self.deep_directories:
+            f.write(f'\n\n以下目录深度超过{self.max_depth}级：\n')
+            for dir_path in sorted(self.deep_directories):
+                f.write(f"- {dir_path}\n")
+
+        if self.large_directories:
+            f.write(f'\n\n以下目录包含超过{self.max_files}个文件：\n')
+            for dir_path in sorted(self.large_directories):
+                f.write(f"- {dir_path}\n")
+
+    def write_jsonl(self, events, f):
+        """One record per file in walk order; a directory's record follows its contents, with subtree totals.
+
+        depth is the number of path components, so the root directory's closing record has depth 0.
+        """
+        for event in events:
+            if event[0] == 'entry':
+                _, depth, _, rel_path, is_dir, size, _ = event
+                if not is_dir:
+                    f.write(json.dumps({'type': 'file', 'path': rel_path, 'depth': depth + 1, 'bytes': size},
+                                       ensure_ascii=False) + '\n')
             else:
-                self.output.append(f"{prefix}{branch}{item}")
+                frame = event[1]
+                f.write(json.dumps({'type': 'dir', 'path': frame.rel_path, 'depth': frame.depth,
+                                    'files': frame.files, 'dirs': frame.dirs, 'bytes': frame.bytes},
+                                   ensure_ascii=False) + '\n')
 
-            if is_last and depth > 0:
-                self.output.append(f"{prefix}")
+    def write_json(self, events, f):
+        """A nested tree; every directory node carries its subtree's file, directory and byte totals."""
+        root = {'name': os.path.basename(self.root_path), 'path': '', 'type': 'dir', 'children': []}
+        nodes = [root]
+        for event in events:
+            if event[0] == 'entry':
+                _, _, name, rel_path, is_dir, size, _ = event
+                if is_dir:
+                    node = {'name': name, 'path': rel_path, 'type': 'dir', 'children': []}
+                    nodes[-1]['children'].append(node)
+                    nodes.append(node)
+                else:
+                    nodes[-1]['children'].append({'name': name, 'path': rel_path, 'type': 'file', 'bytes': size})
+            else:
+                frame = event[1]
+                node = nodes.pop()
+                node.update(files=frame.files, dirs=frame.dirs, bytes=frame.bytes)
+        json.dump({
+            'tree': root,
+            'deep_directories': sorted(self.deep_directories),
+            'large_directories': sorted(self.large_directories),
+        }, f, ensure_ascii=False, indent=2)
+
+    def explore(self, output_format='text'):
+        dir_name = os.path.basename(self.root_path)
+        extension = {'text': 'txt', 'json': 'json', 'jsonl': 'jsonl'}[output_format]
+        output_filename = f"{dir_name}-目录.{extension}"
+        writer = {'text': self.write_text, 'json': self.write_json, 'jsonl': self.write_jsonl}[output_format]
+
+        # Lines are written as the walk produces them; only the stack of open directories stays in memory
+        with open(output_filename, 'w', encoding='utf-8') as f:
+            if self.workers > 1:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=self.workers) as pool:
+                    writer(self.walk(pool), f)
+            else:
+                writer(self.walk(), f)
+
+        print(f"目录列表已保存到 {output_filename}")
 
 def main():
-    if len(sys.argv) > 1:
-        root_path = sys.argv[1]
-    else:
-        root_path = os.getcwd()
+    parser = argparse.ArgumentParser(description="生成项目目录结构")
+    parser.add_argument('root_path', nargs='?', default=os.getcwd(), help="要列出的目录（默认当前目录）")
+    parser.add_argument('--max-depth', type=int, default=10, help="最大列出深度")
+    parser.add_argument('--max-files', type=int, default=100, help="超过该项数的目录会在结尾列出")
+    parser.add_argument('--workers', type=int, default=1, help="并行预读子目录的线程数（1 表示不并行）")
+    parser.add_argument('--format', choices=['text', 'json', 'jsonl'], default='text',
+                        help="text 为树形文本；json/jsonl 带每个目录的文件数和字节数")
+    args = parser.parse_args()
 
-    explorer = DirectoryExplorer(root_path)
-    explorer.explore()
+    explorer = DirectoryExplorer(args.root_path, args.max_depth, args.max_files, args.workers)
+    explorer.explore(args.format)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()